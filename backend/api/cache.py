@@ -0,0 +1,174 @@
+import hashlib
+import io
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from recipes.models import Recipe, ShoppingCart, Tag
+from .metrics import metrics_registry
+
+RECIPE_CACHE_TIMEOUT = 60 * 60
+# Пропущенный инкремент версии живет не дольше этого срока.
+VERSION_TIMEOUT = 60 * 60
+SHORT_CODE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPES_VERSION_KEY = 'recipe_repr:version'
+RECIPES_TABLE = 'recipes'
+TAGS_TABLE = 'tags'
+INGREDIENTS_TABLE = 'ingredients'
+
+DOCUMENT_CACHE_MAX_SIZE = 512 * 1024
+LOCAL_CACHE_WARNING = (
+    'Кеш в памяти процесса: работающий сервер не увидит изменения до '
+    'перезапуска. Для общего кеша задайте CACHE_BACKEND.')
+
+tag_ids_cache = {'version': None, 'ids': {}}
+
+
+def new_version():
+    """Начальная версия, не повторяет выданные до вытеснения ключа."""
+    return time.time_ns()
+
+
+def get_versions(keys):
+    """Версии по ключам, отсутствующие заводятся заново."""
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=VERSION_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def is_cache_shared():
+    """Инкремент версии виден другим процессам."""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), timeout=VERSION_TIMEOUT)
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe_repr:{recipe_id}:version'
+
+
+def table_version_key(table):
+    return f'table:{table}:version'
+
+
+def user_version_key(user_id):
+    return f'user:{user_id}:version'
+
+
+def get_recipe_keys(recipe_ids, base_url):
+    """Ключи кеша рецептов: id, версия рецепта, общая версия и хост."""
+    common_version, *versions = get_versions(
+        [RECIPES_VERSION_KEY,
+         *(recipe_version_key(recipe_id) for recipe_id in recipe_ids)])
+    return {
+        f'recipe_repr:{recipe_id}:{common_version}:{version}:{base_url}':
+            recipe_id
+        for recipe_id, version in zip(recipe_ids, versions)
+    }
+
+
+def get_cached_recipes(keys):
+    """Общие для всех юзеров представления рецептов из кеша по id."""
+    found = cache.get_many(keys)
+    metrics_registry.count_cache(
+        'recipes', len(found), len(keys) - len(found))
+    return {keys[key]: data for key, data in found.items()}
+
+
+def set_cached_recipes(keys, representations):
+    cache.set_many(
+        {key: representations[recipe_id] for key, recipe_id in keys.items()
+         if recipe_id in representations},
+        timeout=RECIPE_CACHE_TIMEOUT)
+
+
+def bump_table_version(table):
+    bump_version(table_version_key(table))
+
+
+def bump_user_version(user_id):
+    """Меняются избранное, корзина или подписки юзера."""
+    bump_version(user_version_key(user_id))
+
+
+def invalidate_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    for recipe_id in recipe_ids:
+        bump_version(recipe_version_key(recipe_id))
+    bump_table_version(RECIPES_TABLE)
+
+
+def invalidate_all_recipes():
+    bump_version(RECIPES_VERSION_KEY)
+    bump_table_version(RECIPES_TABLE)
+
+
+def get_tag_ids():
+    """Словарь slug -> id тэгов, держится в процессе до смены версии."""
+    version, = get_versions([table_version_key(TAGS_TABLE)])
+    if tag_ids_cache['version'] != version:
+        tag_ids_cache['ids'] = dict(Tag.objects.values_list('slug', 'id'))
+        tag_ids_cache['version'] = version
+    return tag_ids_cache['ids']
+
+
+def get_recipe_id_by_short_code(short_code):
+    """id рецепта по короткому коду, None если такого кода нет.
+
+    Код за рецептом не переназначается, поэтому запись не
+    инвалидируется: вызывающий догружает рецепт по id вместе с
+    проверкой кода.
+    """
+    key = f'short_code:{short_code}'
+    recipe_id = cache.get(key)
+    metrics_registry.count_cache(
+        'short_codes', recipe_id is not None, recipe_id is None)
+    if recipe_id is None:
+        recipe_id = Recipe.objects.filter(url_link=short_code).values_list(
+            'id', flat=True).first()
+        if recipe_id is not None:
+            cache.set(key, recipe_id, timeout=SHORT_CODE_CACHE_TIMEOUT)
+    return recipe_id
+
+
+def get_cart_document_key(user, document_format):
+    """Ключ документа корзины: состав корзины и версии ее рецептов.
+
+    Версии рецептов меняются при правке рецепта и его ингредиентов,
+    общая версия — при правке справочника ингредиентов.
+    """
+    recipe_ids = list(ShoppingCart.objects.filter(user=user).order_by(
+        'recipe_id').values_list('recipe_id', flat=True))
+    versions = get_versions(
+        [RECIPES_VERSION_KEY,
+         *(recipe_version_key(recipe_id) for recipe_id in recipe_ids)])
+    cart_version = hashlib.md5(
+        f'{recipe_ids}:{versions}'.encode()).hexdigest()
+    return f'cart_document:{user.id}:{document_format}:{cart_version}'
+
+
+def get_cached_document(key):
+    content = caches['documents'].get(key)
+    metrics_registry.count_cache(
+        'documents', content is not None, content is None)
+    return None if content is None else io.BytesIO(content)
+
+
+def set_cached_document(key, file):
+    """Кладет документ в кеш, если он не больше DOCUMENT_CACHE_MAX_SIZE."""
+    file.seek(0, io.SEEK_END)
+    if file.tell() <= DOCUMENT_CACHE_MAX_SIZE:
+        file.seek(0)
+        caches['documents'].set(key, file.read())
+    file.seek(0)
@@ -0,0 +1,91 @@
+import csv
+import json
+from dataclasses import asdict
+
+from rest_framework.negotiation import BaseContentNegotiation
+
+from .pdf import create_pdf
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """Параметр format выбирает формат выгрузки, а не рендерер DRF.
+
+    Ошибки отдаются первым рендерером вьюсета.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ShoppingListExporter:
+    """Формат выгрузки списка покупок.
+
+    export() возвращает файл или итератор байтов для FileResponse,
+    cacheable — класть ли готовый документ в кеш документов.
+    """
+
+    content_type = None
+    extension = None
+    cacheable = False
+
+    def export(self, shopping_list):
+        raise NotImplementedError
+
+
+class PDFExporter(ShoppingListExporter):
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    cacheable = True
+
+    def export(self, shopping_list):
+        return create_pdf(shopping_list)
+
+
+class TextExporter(ShoppingListExporter):
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def export(self, shopping_list):
+        for item in shopping_list:
+            yield (f'{item.name.capitalize()} ({item.measurement_unit}): '
+                   f'{item.total_amount}\n').encode()
+
+
+class Echo:
+    """Псевдобуфер: csv.writer пишет строку и сразу получает ее назад."""
+
+    def write(self, value):
+        return value
+
+
+class CSVExporter(ShoppingListExporter):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def export(self, shopping_list):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('name', 'measurement_unit', 'total_amount')).encode()
+        for item in shopping_list:
+            yield writer.writerow((
+                item.name, item.measurement_unit, item.total_amount
+            )).encode()
+
+
+class JSONExporter(ShoppingListExporter):
+    content_type = 'application/json'
+    extension = 'json'
+
+    def export(self, shopping_list):
+        yield b'['
+        for index, item in enumerate(shopping_list):
+            yield (', ' if index else '').encode() + json.dumps(
+                asdict(item), ensure_ascii=False).encode()
+        yield b']'
+
+
+SHOPPING_LIST_EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (PDFExporter(), TextExporter(), CSVExporter(),
+                     JSONExporter())
+}
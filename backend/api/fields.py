@@ -0,0 +1,71 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField без запроса на каждый id.
+
+    Поле проверяет только формат pk, объекты достаются одним IN-запросом
+    в resolve(): для many=True это делает BulkManyRelatedField, для
+    вложенного сериализатора — BulkResolveListSerializer.
+    """
+
+    default_error_messages = {
+        'does_not_exist_many': 'Объектов с id {pk_values} не существует.',
+    }
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def resolve(self, pks):
+        """Объекты по списку pk, неизвестные id — одной ошибкой."""
+        objects = self.get_queryset().in_bulk(set(pks))
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+        if missing:
+            self.fail('does_not_exist_many',
+                      pk_values=', '.join(map(str, missing)))
+        return [objects[pk] for pk in pks]
+
+
+class BulkManyRelatedField(ManyRelatedField):
+
+    def to_internal_value(self, data):
+        return self.child_relation.resolve(super().to_internal_value(data))
+
+
+class BulkResolveListSerializer(serializers.ListSerializer):
+    """Разрешает BulkPrimaryKeyRelatedField всех элементов списка
+    одним запросом на поле."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField):
+                continue
+            # При partial=True поле не обязательно, но без id объект
+            # не найти.
+            if any(field.source not in item for item in items):
+                raise serializers.ValidationError(
+                    {name: [field.error_messages['required']]})
+            try:
+                objects = field.resolve(
+                    [item[field.source] for item in items])
+            except serializers.ValidationError as error:
+                raise serializers.ValidationError({name: error.detail})
+            for item, obj in zip(items, objects):
+                item[field.source] = obj
+        return items
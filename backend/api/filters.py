@@ -1,37 +1,62 @@
+from django.db.models import Exists, OuterRef
 from rest_framework.filters import SearchFilter
 from django_filters.rest_framework import filters, FilterSet
 
-from recipes.models import Recipe, Ingredient, Tag
+from recipes.models import Recipe, Ingredient, FavoriteRecipe, ShoppingCart
+from .cache import get_tag_ids
+from .search import ingredient_index
 
 
 class IngredientSearchFilter(SearchFilter):
+    """Поиск по началу имени через индекс в памяти процесса.
+
+    Индекс отдает список, поэтому используется только для list.
+    """
+
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name or view.action != 'list':
+            return queryset
+        return ingredient_index.search(name)
+
     class Meta:
         model = Ingredient
         fields = ('name',)
 
 
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
 class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(
         method='get_favorite_recipes')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart')
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all())
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags')
 
     class Meta:
         model = Recipe
         fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags')
 
+    def get_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value])))
+
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_carts__user=self.request.user)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk'))))
         return queryset
 
     def get_favorite_recipes(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorite_recipes__user=self.request.user)
+            return queryset.filter(Exists(FavoriteRecipe.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk'))))
         return queryset
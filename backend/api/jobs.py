@@ -0,0 +1,85 @@
+import logging
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import get_cart_document_key
+from .exporters import SHOPPING_LIST_EXPORTERS
+from .models import DocumentJob
+from .shopping_list import get_shopping_list
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_JOB_TTL = timedelta(hours=1)
+# Задача дольше этого срока в RUNNING брошена упавшим воркером.
+DOCUMENT_JOB_LEASE = timedelta(minutes=5)
+LEASE_EXPIRED_ERROR = 'Воркер не завершил задачу.'
+
+
+def stale_document_jobs():
+    return DocumentJob.objects.filter(
+        status=DocumentJob.RUNNING,
+        started__lt=timezone.now() - DOCUMENT_JOB_LEASE)
+
+
+def enqueue_document_job(user, document_format):
+    """Ставит рендер в очередь, одна живая задача на версию корзины."""
+    key = get_cart_document_key(user, document_format)
+    job = DocumentJob.objects.filter(
+        user=user, document_key=key,
+        created__gte=timezone.now() - DOCUMENT_JOB_TTL,
+    ).exclude(status=DocumentJob.FAILED).exclude(
+        id__in=stale_document_jobs().values('id')).last()
+    if job is None:
+        job = DocumentJob.objects.create(
+            user=user, document_key=key, document_format=document_format)
+    return job
+
+
+def claim_document_job():
+    """Берет старейшую задачу, занятые другими воркерами пропускает.
+
+    Задачи упавших воркеров, просрочившие DOCUMENT_JOB_LEASE, помечаются
+    упавшими: клиент увидит ошибку и поставит задачу заново.
+    """
+    now = timezone.now()
+    stale_document_jobs().update(
+        status=DocumentJob.FAILED, error=LEASE_EXPIRED_ERROR, finished=now)
+    with transaction.atomic():
+        job = DocumentJob.objects.select_for_update(
+            skip_locked=True).filter(status=DocumentJob.PENDING).first()
+        if job is not None:
+            job.status = DocumentJob.RUNNING
+            job.started = now
+            job.save(update_fields=('status', 'started'))
+    return job
+
+
+def run_document_job(job):
+    exporter = SHOPPING_LIST_EXPORTERS[job.document_format]
+    try:
+        document = exporter.export(get_shopping_list(job.user))
+        if not hasattr(document, 'read'):
+            document = ContentFile(b''.join(document))
+        job.file.save(f'{job.id}.{exporter.extension}', File(document),
+                      save=False)
+        job.status = DocumentJob.DONE
+    except Exception as error:
+        logger.exception('Задача выгрузки %s упала', job.id)
+        job.status = DocumentJob.FAILED
+        job.error = str(error)
+    job.finished = timezone.now()
+    job.save()
+
+
+def delete_expired_document_jobs():
+    """Удаляет задачи старше DOCUMENT_JOB_TTL вместе с файлами."""
+    expired = DocumentJob.objects.filter(
+        created__lt=timezone.now() - DOCUMENT_JOB_TTL)
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    return expired.delete()[0]
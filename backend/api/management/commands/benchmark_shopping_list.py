@@ -0,0 +1,88 @@
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.exporters import SHOPPING_LIST_EXPORTERS
+from api.shopping_list import get_shopping_list
+from recipes.models import Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from users.models import User
+
+INGREDIENTS_PER_RECIPE = 10
+RECIPE_STEP = 5
+
+
+class Command(BaseCommand):
+    help = ('Замер сборки списка покупок на корзинах разного размера. '
+            'Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(10, 100, 1000),
+            help='Число разных ингредиентов в корзине.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Повторов замера, берется лучший.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('ингредиентов  строк корзины  сборка, мс' + ''.join(
+            f'  {name.upper()}, мс' for name in SHOPPING_LIST_EXPORTERS))
+        for size in options['sizes']:
+            with transaction.atomic():
+                user, rows = self.create_cart(size)
+                timings = self.measure(user, options['repeat'])
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{size:>12}  {rows:>13}  {timings.pop("aggregate"):>10.2f}'
+                + ''.join(f'  {timings[name]:>{len(name) + 4}.2f}'
+                          for name in SHOPPING_LIST_EXPORTERS))
+
+    @staticmethod
+    def best_of(repeat, func, *args):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(*args)
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    @staticmethod
+    def export(exporter, shopping_list):
+        deque(exporter.export(shopping_list), maxlen=0)
+
+    def measure(self, user, repeat):
+        shopping_list = get_shopping_list(user)
+        timings = {
+            name: self.best_of(repeat, self.export, exporter, shopping_list)
+            for name, exporter in SHOPPING_LIST_EXPORTERS.items()
+        }
+        timings['aggregate'] = self.best_of(repeat, get_shopping_list, user)
+        return timings
+
+    @staticmethod
+    def create_cart(size):
+        """Корзина из size ингредиентов, каждый входит в два рецепта."""
+        user = User.objects.create(
+            email='benchmark@foodgram.local', username='benchmark')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark {i}', measurement_unit='г')
+            for i in range(size))
+        recipes = []
+        for i in range(max(1, size // RECIPE_STEP)):
+            recipe = Recipe(author=user, name=f'benchmark {i}', text='-',
+                            cooking_time=1, image='recipes/benchmark.png',
+                            url_link=f'benchmark{i}')
+            recipes.append(recipe)
+        recipes = Recipe.objects.bulk_create(recipes)
+        recipe_ingredients = RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (i * RECIPE_STEP + k) % size],
+                amount=k + 1)
+            for i, recipe in enumerate(recipes)
+            for k in range(min(INGREDIENTS_PER_RECIPE, size)))
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes)
+        return user, len(recipe_ingredients)
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import (claim_document_job, delete_expired_document_jobs,
+                      run_document_job)
+
+
+class Command(BaseCommand):
+    help = ('Воркер фонового рендера списков покупок. '
+            'Число воркеров равно числу запущенных команд.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти.')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, сек.')
+
+    def handle(self, *args, **options):
+        while True:
+            delete_expired_document_jobs()
+            job = claim_document_job()
+            if job is not None:
+                run_document_job(job)
+                self.stdout.write(f'Задача {job.id}: {job.status}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
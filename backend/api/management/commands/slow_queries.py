@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from api.slow_queries import slow_query_log
+
+ORDERINGS = ('total', 'count', 'p95')
+
+
+class Command(BaseCommand):
+    help = ('Самые тяжелые отпечатки SQL из снимков воркеров в '
+            'METRICS_DIR: медленные и повторяющиеся в одном запросе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--order-by', choices=ORDERINGS, default='total')
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='EXPLAIN самого медленного примера, только PostgreSQL.')
+
+    def handle(self, *args, **options):
+        if not settings.METRICS_DIR:
+            raise CommandError('Не задан METRICS_DIR.')
+        if options['explain'] and connection.vendor != 'postgresql':
+            raise CommandError('--explain работает только с PostgreSQL.')
+        entries = slow_query_log.merge(slow_query_log.read_snapshots())
+        top = sorted(entries.items(), key=lambda item: item[1][
+            options['order_by']], reverse=True)[:options['limit']]
+        if not top:
+            self.stdout.write('Медленных запросов нет.')
+        for position, (sql, entry) in enumerate(top, 1):
+            self.stdout.write(self.style.SQL_KEYWORD(
+                f'{position}. {entry["count"]} раз, '
+                f'всего {entry["total"] * 1000:.1f} мс, '
+                f'p95 {entry["p95"] * 1000:.1f} мс'))
+            for title in ('views', 'fields'):
+                self.stdout.write(f'   {title}: ' + (', '.join(
+                    f'{name} ({count})'
+                    for name, count in sorted(
+                        entry[title].items(), key=lambda item: -item[1])[:3]
+                ) or '-'))
+            self.stdout.write(f'   {sql}')
+            if options['explain']:
+                self.explain(*entry['example'])
+
+    def explain(self, sql, params):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                plan = cursor.fetchall()
+        except DatabaseError as error:
+            self.stdout.write(self.style.WARNING(f'   EXPLAIN: {error}'))
+            return
+        for line, in plan:
+            self.stdout.write(f'   | {line}')
@@ -0,0 +1,177 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+
+METRICS_PREFIX = 'foodgram_'
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+            '\n', r'\n'))
+        for name, value in labels)
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class ProcessSnapshots:
+    """Данные процесса, общие для воркеров gunicorn через файлы.
+
+    Каждый воркер раз в FLUSH_INTERVAL пишет свой снимок в
+    METRICS_DIR/<pid>.<kind>.json, читатель собирает все файлы. Без
+    METRICS_DIR видны данные только текущего процесса.
+    """
+
+    kind = None
+
+    def __init__(self):
+        self.lock = Lock()
+        self.flushed = 0.0
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def flush(self, force=False):
+        """Пишет снимок процесса не чаще FLUSH_INTERVAL."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or not force and now - self.flushed < FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(directory, exist_ok=True)
+        path = Path(directory) / f'{os.getpid()}.{self.kind}.json'
+        temporary = path.with_suffix('.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file, default=str)
+        os.replace(temporary, path)
+
+    def read_snapshots(self):
+        """Снимки всех воркеров из METRICS_DIR."""
+        snapshots = []
+        for path in Path(settings.METRICS_DIR).glob(f'*.{self.kind}.json'):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def snapshots(self):
+        if not settings.METRICS_DIR:
+            return [self.snapshot()]
+        self.flush(force=True)
+        return self.read_snapshots()
+
+
+class MetricsRegistry(ProcessSnapshots):
+    """Счетчики и гистограммы по вьюсетам и кешам."""
+
+    kind = 'metrics'
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        super().__init__()
+        self.buckets = buckets
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[name, labels_key(labels)] += value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            key = name, labels_key(labels)
+            if key not in self.histograms:
+                self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram = self.histograms[key]
+            histogram[bisect_left(self.buckets, value)] += 1
+            histogram[-1] += value
+
+    def count_cache(self, cache, hits, misses):
+        """Попадания и промахи кеша для доли попаданий."""
+        if hits:
+            self.inc('cache_requests_total',
+                     {'cache': cache, 'result': 'hit'}, hits)
+        if misses:
+            self.inc('cache_requests_total',
+                     {'cache': cache, 'result': 'miss'}, misses)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, list(histogram)]
+                    for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def collect(self):
+        """Сумма снимков всех воркеров."""
+        counters = defaultdict(float)
+        histograms = {}
+        for snapshot in self.snapshots():
+            for name, labels, value in snapshot['counters']:
+                counters[name, tuple(map(tuple, labels))] += value
+            for name, labels, values in snapshot['histograms']:
+                key = name, tuple(map(tuple, labels))
+                if key in histograms:
+                    histograms[key] = [
+                        a + b for a, b in zip(histograms[key], values)]
+                else:
+                    histograms[key] = values
+        return counters, histograms
+
+    def render(self):
+        """Текстовый формат Prometheus 0.0.4."""
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {METRICS_PREFIX}{name} counter')
+            lines.extend(
+                f'{METRICS_PREFIX}{name}{format_labels(labels)} '
+                f'{format_value(counters[name, labels])}'
+                for key_name, labels in sorted(counters)
+                if key_name == name)
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {METRICS_PREFIX}{name} histogram')
+            for key_name, labels in sorted(histograms):
+                if key_name != name:
+                    continue
+                *counts, total = histograms[name, labels]
+                cumulative = 0
+                for bound, count in zip(
+                        (*map(str, self.buckets), '+Inf'), counts):
+                    cumulative += count
+                    lines.append(
+                        f'{METRICS_PREFIX}{name}_bucket'
+                        f'{format_labels((*labels, ("le", bound)))} '
+                        f'{cumulative}')
+                lines.append(f'{METRICS_PREFIX}{name}_sum'
+                             f'{format_labels(labels)} {total!r}')
+                lines.append(f'{METRICS_PREFIX}{name}_count'
+                             f'{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry()
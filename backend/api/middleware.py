@@ -0,0 +1,171 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import metrics_registry
+from .slow_queries import slow_query_log
+
+logger = logging.getLogger('api.timing')
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """Счетчики одного запроса, время в секундах.
+
+    Секции, поля сериализаторов и медленные запросы пишутся только для
+    попавших в выборку запросов (sampled), метрикам нужны число и время
+    запросов к БД.
+    """
+
+    def __init__(self, sampled):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.view = None
+        self.field = None
+        self.queries = 0
+        self.sections = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.active = set()
+        self.repeats = Counter()
+        self.slow_threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.repeat_threshold = settings.SLOW_QUERY_REPEAT_THRESHOLD
+
+    def add(self, section, elapsed):
+        self.sections[section] += elapsed
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.add('db', elapsed)
+            if self.sampled and not many:
+                self.repeats[sql] += 1
+                if (elapsed >= self.slow_threshold
+                        or self.repeats[sql] >= self.repeat_threshold):
+                    slow_query_log.record(
+                        sql, params, elapsed, self.view, self.field)
+
+
+@contextmanager
+def timed(section):
+    """Замер секции текущего запроса, вложенные вызовы не суммируются."""
+    timings = current_timings.get()
+    if (timings is None or not timings.sampled
+            or section in timings.active):
+        yield
+        return
+    timings.active.add(section)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(section)
+        timings.add(section, time.perf_counter() - started)
+
+
+def get_view_name(view_func, method):
+    """RecipeViewSet.list, UserViewSet.subscriptions и т.п."""
+    view_class = getattr(view_func, 'cls', None) or getattr(
+        view_func, 'view_class', None)
+    if view_class is None:
+        return view_func.__qualname__
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class RequestTimingMiddleware:
+    """Замеры запроса: Server-Timing, строка лога и метрики.
+
+    Server-Timing, лог и медленные запросы включает PERFORMANCE_TIMING,
+    доля замеряемых запросов — PERFORMANCE_TIMING_SAMPLE_RATE. Хуки
+    сериализаторов ставятся только с PERFORMANCE_TIMING. Метрики при
+    METRICS_ENABLED собираются по каждому запросу.
+    """
+
+    def __init__(self, get_response):
+        self.timing = settings.PERFORMANCE_TIMING
+        self.metrics = settings.METRICS_ENABLED
+        if not self.timing and not self.metrics:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PERFORMANCE_TIMING_SAMPLE_RATE
+
+    def __call__(self, request):
+        sampled = self.timing and random.random() < self.sample_rate
+        if not sampled and not self.metrics:
+            return self.get_response(request)
+        timings = RequestTimings(sampled)
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - timings.started
+        if self.metrics:
+            self.record_metrics(request, response, timings, total)
+        if sampled:
+            self.add_server_timing(request, response, timings, total)
+            slow_query_log.flush()
+        return response
+
+    @staticmethod
+    def record_metrics(request, response, timings, total):
+        view = timings.view or 'unresolved'
+        metrics_registry.inc('requests_total', {
+            'view': view, 'method': request.method,
+            'status': response.status_code})
+        metrics_registry.observe(
+            'request_duration_seconds', {'view': view}, total)
+        metrics_registry.inc(
+            'db_queries_total', {'view': view}, timings.queries)
+        metrics_registry.inc(
+            'db_duration_seconds_total', {'view': view},
+            timings.sections['db'])
+        metrics_registry.flush()
+
+    @staticmethod
+    def add_server_timing(request, response, timings, total):
+        response['Server-Timing'] = ', '.join(
+            [f'{name};dur={elapsed * 1000:.1f}'
+             for name, elapsed in timings.sections.items()]
+            + [f'queries;desc="{timings.queries}"',
+               f'total;dur={total * 1000:.1f}'])
+        logger.info(json.dumps({
+            'view': timings.view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timings.queries,
+            **{f'{name}_ms': round(elapsed * 1000, 1)
+               for name, elapsed in timings.sections.items()},
+            'total_ms': round(total * 1000, 1),
+        }))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current_timings.get()
+        if timings is not None:
+            timings.view = get_view_name(view_func, request.method.lower())
+
+    def process_template_response(self, request, response):
+        timings = current_timings.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: timings.add(
+                    'render', time.perf_counter() - started))
+        return response
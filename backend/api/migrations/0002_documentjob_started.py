@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentjob',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взята воркером'),
+        ),
+    ]
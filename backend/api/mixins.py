@@ -0,0 +1,165 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from django.http import HttpResponse
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+
+from .cache import get_versions, table_version_key, user_version_key
+from .metrics import metrics_registry
+from .middleware import current_timings, timed
+
+
+class ConditionalGetMixin:
+    """ETag по версиям таблиц и 304 до запуска серилизаторов.
+
+    etag_tables — таблицы, от которых зависит ответ, при
+    etag_per_user ответ зависит еще от избранного, корзины и подписок
+    юзера и варьируется по заголовку Authorization.
+    """
+
+    etag_tables = ()
+    etag_per_user = False
+
+    def get_etag(self, request):
+        keys = [table_version_key(table) for table in self.etag_tables]
+        parts = [request.get_full_path()]
+        if self.etag_per_user:
+            user_id = request.user.id
+            parts.append(str(user_id))
+            if user_id is not None:
+                keys.append(user_version_key(user_id))
+        parts.extend(str(version) for version in get_versions(keys))
+        return '"{}"'.format(
+            hashlib.md5(':'.join(parts).encode()).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.get_fresh_response(
+                handler, etag, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        if self.etag_per_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_fresh_response(self, handler, etag, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class PrerenderedResponses:
+    """Готовые байты ответов в памяти процесса, LRU по числу записей."""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.responses = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.responses:
+                return None
+            self.responses.move_to_end(key)
+            return self.responses[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.responses[key] = value
+            self.responses.move_to_end(key)
+            while len(self.responses) > self.max_size:
+                self.responses.popitem(last=False)
+
+
+prerendered_responses = PrerenderedResponses()
+
+
+class PrerenderedResponseMixin(ConditionalGetMixin):
+    """Справочники: отрендеренный ответ хранится в процессе по ETag.
+
+    ETag включает версию таблицы, поэтому правка через админку сразу
+    дает новый ключ, а старые записи вытесняются.
+    """
+
+    cache_max_age = 60 * 60 * 24
+
+    def get_fresh_response(self, handler, etag, request, *args, **kwargs):
+        renderer, media_type = self.perform_content_negotiation(request)
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = (type(self).__name__, etag, media_type)
+        stored = prerendered_responses.get(key)
+        metrics_registry.count_cache(
+            'prerendered', stored is not None, stored is None)
+        if stored is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.accepted_renderer = renderer
+            response.accepted_media_type = media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            stored = (response.content, response['Content-Type'])
+            prerendered_responses.set(key, stored)
+        content, content_type = stored
+        response = HttpResponse(content, content_type=content_type)
+        patch_cache_control(response, public=True, max_age=self.cache_max_age)
+        return response
+
+
+class TimedSerializerMixin:
+    """Время вывода сериализатора в секции serialize замеряемого
+    запроса.
+
+    Верхний сериализатор ответа отдается через data, вложенные и
+    элементы списков — через to_representation. Вложенные замеры не
+    суммируются. В замеряемом запросе поля выводятся по одному, и
+    текущее поле запоминается, чтобы медленный запрос можно было
+    привязать к нему.
+    """
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+    def to_representation(self, instance):
+        timings = current_timings.get()
+        if (timings is None or not timings.sampled
+                or not hasattr(self, 'fields')):
+            return super().to_representation(instance)
+        with timed('serialize'):
+            return self.traced_representation(instance, timings)
+
+    def traced_representation(self, instance, timings):
+        representation = {}
+        previous = timings.field
+        try:
+            for name, field in self.fields.items():
+                if field.write_only:
+                    continue
+                timings.field = f'{type(self).__name__}.{name}'
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+                value = (attribute.pk if isinstance(attribute, PKOnlyObject)
+                         else attribute)
+                representation[name] = (
+                    None if value is None
+                    else field.to_representation(attribute))
+        finally:
+            timings.field = previous
+        return representation
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.functional import cached_property
+
+from users.models import User
+
+
+class DocumentStorage(FileSystemStorage):
+    """Документы лежат в DOCUMENTS_ROOT вне MEDIA_ROOT, nginx их не
+    раздает."""
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.DOCUMENTS_ROOT)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'DOCUMENTS_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+
+document_storage = DocumentStorage()
+
+
+def get_document_storage():
+    return document_storage
+
+
+class DocumentJob(models.Model):
+    """Задача фонового рендера списка покупок."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='document_jobs',
+        verbose_name='Пользователь'
+    )
+    document_key = models.CharField(
+        'Версия корзины', max_length=255, db_index=True)
+    document_format = models.CharField('Формат', max_length=8)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING)
+    file = models.FileField(
+        'Документ', storage=get_document_storage,
+        upload_to='shopping_lists', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Взята воркером', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ('created', 'id')
+        verbose_name = 'Задача выгрузки'
+        verbose_name_plural = 'Задачи выгрузки'
+
+    def __str__(self):
+        return f'{self.document_format} для {self.user}: {self.status}'
@@ -1,6 +1,54 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+MAX_PAGE_SIZE = 100
 
 
 class PagePagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+    max_page_size = MAX_PAGE_SIZE
+
+
+class OrderingCursorPagination(CursorPagination):
+    """Курсорная пагинация по сортировке из Meta модели."""
+
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return (queryset.query.order_by
+                or queryset.model._meta.ordering
+                or self.ordering)
+
+
+class PageOrCursorPagination(PagePagination):
+    """Номера страниц по умолчанию, курсор (без COUNT) при ?cursor=."""
+
+    cursor_pagination_class = OrderingCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = self.cursor_pagination_class()
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is None:
+            return super().get_paginated_response(data)
+        return self.cursor_paginator.get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        cursor_parameters = [
+            parameter for parameter
+            in self.cursor_pagination_class().get_schema_operation_parameters(
+                view)
+            if parameter['name'] != self.page_size_query_param
+        ]
+        return (super().get_schema_operation_parameters(view)
+                + cursor_parameters)
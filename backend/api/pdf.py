@@ -1,58 +1,75 @@
-from dataclasses import dataclass
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+
 from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfgen import canvas
-from django.http import HttpResponse
-
-from recipes.models import RecipeIngredient
-
-
-@dataclass
-class IngredientInfo:
-    name: str
-    measurement_unit: str
-    total_amount: int
-
-
-def create_ingredients_list(request):
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__shopping_carts__user=request.user).select_related(
-        'ingredient'
-    )
-    ingredient_info_list = []
-    print(ingredients)
-    for recipe_ingredient in ingredients:
-        name = recipe_ingredient.ingredient.name
-        measurement_unit = recipe_ingredient.ingredient.measurement_unit
-        amount = recipe_ingredient.amount
-        if name not in [i.name for i in ingredient_info_list]:
-            ingredient_info = IngredientInfo(
-                name=name, measurement_unit=measurement_unit,
-                total_amount=amount)
-            ingredient_info_list.append(ingredient_info)
-            continue
-        for ingredient_info in ingredient_info_list:
-            if ingredient_info.name == name:
-                ingredient_info.total_amount += amount
-    ingredient_info_list.sort(key=lambda x: x.name)
-    return ingredient_info_list
-
-
-def create_pdf(final_list, filename):
-    response = HttpResponse(content_type='application/pdf')
-    response[
-        'Content-Disposition'] = f'attachment; filename="{filename}"'
-    p = canvas.Canvas(response, pagesize=letter)
-    p.setFont('Arial', 15)
+
+FONT_NAME = 'Arial'
+FONT_SIZE = 15
+LINE_HEIGHT = 20
+MARGIN_X = 30
+MARGIN_TOP = 40
+MARGIN_BOTTOM = 40
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def char_width(char):
+    """Ширина символа шрифта, метрики считаются один раз на процесс."""
+    return pdfmetrics.stringWidth(char, FONT_NAME, FONT_SIZE)
+
+
+def text_width(text):
+    return sum(char_width(char) for char in text)
+
+
+def wrap_line(text, max_width):
+    """Разбивает строку по словам, чтобы она влезла в ширину страницы."""
+    lines = []
+    line, width = '', 0
+    space_width = char_width(' ')
+    for word in text.split():
+        word_width = text_width(word)
+        if line and width + space_width + word_width > max_width:
+            lines.append(line)
+            line, width = '', 0
+        if line:
+            line, width = f'{line} {word}', width + space_width + word_width
+        else:
+            line, width = word, word_width
+    lines.append(line)
+    return lines
+
+
+def render_pdf(final_list, file):
+    """Рисует список на нужном числе страниц и пишет PDF в file."""
+    p = canvas.Canvas(file, pagesize=letter)
     width, height = letter
-    y = height - 40
-    p.drawString(30, y, 'Список ингредиентов:')
-    y -= 20
+    max_width = width - 2 * MARGIN_X
+    p.setFont(FONT_NAME, FONT_SIZE)
+    y = height - MARGIN_TOP
+    p.drawString(MARGIN_X, y, 'Список ингредиентов:')
+    y -= LINE_HEIGHT
     for ingredient_info in final_list:
         name = ingredient_info.name.capitalize()
         measurement_unit = ingredient_info.measurement_unit
         total_amount = ingredient_info.total_amount
-        p.drawString(30, y, f'{name} ({measurement_unit}): {total_amount}')
-        y -= 20
+        for line in wrap_line(
+                f'{name} ({measurement_unit}): {total_amount}', max_width):
+            if y < MARGIN_BOTTOM:
+                p.showPage()
+                p.setFont(FONT_NAME, FONT_SIZE)
+                y = height - MARGIN_TOP
+            p.drawString(MARGIN_X, y, line)
+            y -= LINE_HEIGHT
     p.showPage()
     p.save()
-    return response
+
+
+def create_pdf(final_list):
+    """PDF собирается в памяти, большой уходит во временный файл."""
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    render_pdf(final_list, file)
+    file.seek(0)
+    return file
@@ -0,0 +1,44 @@
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from .cache import INGREDIENTS_TABLE, get_versions, table_version_key
+
+INGREDIENTS_SEARCH_LIMIT = 50
+
+
+class IngredientPrefixIndex:
+    """Отсортированный по имени индекс ингредиентов в памяти процесса.
+
+    Строится при первом поиске и перестраивается после смены версии
+    таблицы ингредиентов.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = ([], [])
+
+    def refresh(self):
+        version, = get_versions([table_version_key(INGREDIENTS_TABLE)])
+        if version == self.version:
+            return
+        entries = sorted(
+            ((ingredient.name.lower(), ingredient.id), ingredient)
+            for ingredient in Ingredient.objects.all())
+        self.entries = (
+            [key for key, _ in entries], [item for _, item in entries])
+        self.version = version
+
+    def search(self, prefix, limit=INGREDIENTS_SEARCH_LIMIT):
+        """Ингредиенты по началу имени.
+
+        Точное совпадение короче остальных и в сортировке идет первым.
+        """
+        self.refresh()
+        keys, ingredients = self.entries
+        prefix = prefix.strip().lower()
+        start = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (prefix + '\uffff',), lo=start)
+        return ingredients[start:min(end, start + limit)]
+
+
+ingredient_index = IngredientPrefixIndex()
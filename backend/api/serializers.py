@@ -1,3 +1,6 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from drf_extra_fields.fields import Base64ImageField
@@ -5,15 +8,21 @@ from drf_extra_fields.fields import Base64ImageField
 from users.models import User, Follow
 from recipes.models import (
     Recipe,
+    RecipeQuerySet,
     Tag,
     RecipeIngredient,
     Ingredient,
     FavoriteRecipe,
     ShoppingCart,
 )
+from .fields import BulkPrimaryKeyRelatedField, BulkResolveListSerializer
+from .mixins import TimedSerializerMixin
+from .models import DocumentJob
+from .cache import (get_cached_recipes, get_recipe_keys, invalidate_recipes,
+                    set_cached_recipes)
 
 
-class AvatarSerializer(serializers.ModelSerializer):
+class AvatarSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Серилизатор аватарки."""
 
     avatar = Base64ImageField()
@@ -23,7 +32,7 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Серилизатор Юзера."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
@@ -40,14 +49,23 @@ class UserSerializer(serializers.ModelSerializer):
             'avatar',
         )
 
+    def get_following_ids(self):
+        """Id авторов, на которых подписан юзер, один запрос на запрос."""
+        if 'following_ids' not in self.context:
+            user = self.context.get('request').user
+            self.context['following_ids'] = set(
+                Follow.objects.filter(user=user).order_by().values_list(
+                    'following_id', flat=True))
+        return self.context['following_ids']
+
     def get_is_subscribed(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return Follow.objects.filter(user=user, following=obj).exists()
+        return obj.id in self.get_following_ids()
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Серилизатор тэгов."""
 
     class Meta:
@@ -59,7 +77,7 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Серилизатор ингредиентов."""
 
     class Meta:
@@ -74,16 +92,18 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientCreateUpdateSerializer(serializers.ModelSerializer):
     """Серилизатор добавления ингредиентов."""
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(), required=True)
     amount = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = BulkResolveListSerializer
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(TimedSerializerMixin,
+                                 serializers.ModelSerializer):
     """Серилизатор количества ингредиентов."""
 
     id = serializers.ReadOnlyField(source='ingredient.id')
@@ -96,8 +116,23 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Серилизатор рецептов."""
+class RecipeListSerializer(TimedSerializerMixin,
+                           serializers.ListSerializer):
+    """Серилизатор списка рецептов, кеш достается одним запросом."""
+
+    def to_representation(self, data):
+        recipes = list(data)
+        self.child.load_representations(recipes)
+        return [self.child.to_representation(recipe) for recipe in recipes]
+
+
+class RecipeReadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Серилизатор рецептов.
+
+    Общая для всех юзеров часть представления кешируется, флаги
+    is_favorited, is_in_shopping_cart и is_subscribed накладываются
+    при каждом ответе.
+    """
 
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
@@ -123,14 +158,52 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def load_representations(self, recipes):
+        """Берет представления из кеша, недостающие собирает и кладет."""
+        representations = self.context.setdefault(
+            'recipe_representations', {})
+        keys = get_recipe_keys(
+            [recipe.id for recipe in recipes],
+            self.context['request'].build_absolute_uri('/'))
+        representations.update(get_cached_recipes(keys))
+        missing = [recipe for recipe in recipes
+                   if recipe.id not in representations]
+        if not missing:
+            return
+        prefetch_related_objects(
+            missing, *RecipeQuerySet.get_read_prefetches())
+        built = {}
+        for recipe in missing:
+            built[recipe.id] = super().to_representation(recipe)
+        set_cached_recipes(keys, built)
+        representations.update(built)
+
+    def to_representation(self, instance):
+        representations = self.context.get('recipe_representations', {})
+        if instance.id not in representations:
+            self.load_representations([instance])
+        data = dict(self.context['recipe_representations'][instance.id])
+        data['author'] = dict(
+            data['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                instance.author))
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return user.favorite_recipes.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -140,7 +213,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Серилизатор добавления рецептов."""
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all())
     author = UserSerializer(read_only=True)
     ingredients = IngredientCreateUpdateSerializer(
@@ -184,28 +257,50 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                              amount=ingredient['amount'])
             for ingredient in ingredients
         )
+        transaction.on_commit(lambda: invalidate_recipes([recipe.id]))
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Меняет только разницу: удаляет лишние строки, обновляет
+        количество у изменившихся и добавляет новые."""
+        amounts = {item['id'].id: item['amount'] for item in ingredients}
+        existing = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)}
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         if tags is not None:
             instance.tags.set(tags)
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is not None:
-            instance.ingredients.clear()
-            RecipeIngredient.objects.bulk_create(
-                RecipeIngredient(recipe=instance,
-                                 ingredient=ingredient['id'],
-                                 amount=ingredient['amount'])
-                for ingredient in ingredients
-            )
+            self.update_ingredients(instance, ingredients)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         return RecipeReadSerializer(instance, context=self.context).data
 
 
-class RecipeShopFavorSerializer(serializers.ModelSerializer):
+class RecipeShopFavorSerializer(TimedSerializerMixin,
+                                serializers.ModelSerializer):
     """Серилизатор добавления изображения рецепта."""
 
     image = Base64ImageField()
@@ -220,7 +315,7 @@ class SubscriptionsSerializer(UserSerializer):
     """Серилизатор подписок друг на друга."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         fields = (
@@ -236,6 +331,9 @@ class SubscriptionsSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'preview_recipes'):
+            return RecipeShopFavorSerializer(
+                obj.preview_recipes, many=True).data
         recipes = obj.recipes.all()
         recipes_limit = self.context[
             'request'].query_params.get('recipes_limit')
@@ -243,9 +341,6 @@ class SubscriptionsSerializer(UserSerializer):
             recipes = recipes[:int(recipes_limit)]
         return RecipeShopFavorSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscribeSerializer(serializers.ModelSerializer):
     """Сериализатор подписок список."""
@@ -313,3 +408,18 @@ class FavoriteRecipeSerializer(BaseRecipeSerializer):
                 message='Вы уже подписаны на этого автора!',
             )
         ]
+
+
+class DocumentJobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Сериализатор задачи фонового рендера."""
+
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentJob
+        fields = ('id', 'status', 'document_format', 'error', 'url')
+
+    def get_url(self, obj):
+        url = reverse('recipes-shopping-cart-job', kwargs={'job_id': obj.id})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
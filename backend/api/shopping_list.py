@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+from django.db.models import F, Sum
+
+from recipes.models import RecipeIngredient
+
+
+@dataclass
+class IngredientInfo:
+    name: str
+    measurement_unit: str
+    total_amount: int
+
+
+def get_shopping_list(user):
+    """Суммы ингредиентов корзины юзера одним запросом с GROUP BY."""
+    return [
+        IngredientInfo(**row) for row in RecipeIngredient.objects.filter(
+            recipe__shopping_carts__user=user,
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        ).annotate(
+            total_amount=Sum('amount'),
+        ).order_by('name', 'measurement_unit')
+    ]
@@ -0,0 +1,72 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Follow, User
+from .cache import (INGREDIENTS_TABLE, TAGS_TABLE, bump_table_version,
+                    bump_user_version, invalidate_all_recipes,
+                    invalidate_recipes)
+
+USER_REPRESENTED_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'avatar'}
+
+
+def after_commit(func, *args):
+    """Версии меняются после коммита: иначе параллельный запрос успеет
+    положить старые строки под новую версию."""
+    transaction.on_commit(partial(func, *args))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    after_commit(invalidate_recipes, [instance.id])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    after_commit(invalidate_recipes, [instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        after_commit(invalidate_recipes, [instance.id])
+    elif pk_set:
+        after_commit(invalidate_recipes, list(pk_set))
+    else:
+        after_commit(invalidate_all_recipes)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    after_commit(bump_table_version, TAGS_TABLE)
+    after_commit(invalidate_all_recipes)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    after_commit(bump_table_version, INGREDIENTS_TABLE)
+    after_commit(invalidate_all_recipes)
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipe)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def user_state_changed(sender, instance, **kwargs):
+    after_commit(bump_user_version, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not USER_REPRESENTED_FIELDS & set(update_fields):
+        return
+    after_commit(invalidate_recipes, list(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)))
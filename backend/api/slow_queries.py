@@ -0,0 +1,91 @@
+import re
+from collections import Counter
+
+from .metrics import ProcessSnapshots
+
+MAX_SAMPLES = 200
+
+NORMALIZE_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def fingerprint(sql):
+    """SQL без литералов и параметров: IN (?, ?, ?) дает IN (...)."""
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def new_entry():
+    return {'count': 0, 'total': 0.0, 'samples': [], 'views': Counter(),
+            'fields': Counter(), 'example': None, 'slowest': 0.0}
+
+
+class SlowQueryLog(ProcessSnapshots):
+    """Медленные и повторяющиеся запросы по отпечаткам.
+
+    Для отпечатка хранятся число, суммарное время, последние
+    MAX_SAMPLES длительностей для p95, вьюсеты и поля сериализаторов,
+    при выводе которых выполнялся запрос, и самый медленный пример с
+    параметрами для EXPLAIN.
+    """
+
+    kind = 'slow_queries'
+
+    def __init__(self):
+        super().__init__()
+        self.entries = {}
+
+    def record(self, sql, params, duration, view, field):
+        key = fingerprint(sql)
+        with self.lock:
+            entry = self.entries.setdefault(key, new_entry())
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['samples'] = (entry['samples'] + [duration])[-MAX_SAMPLES:]
+            entry['views'][view or 'unresolved'] += 1
+            if field:
+                entry['fields'][field] += 1
+            if duration >= entry['slowest']:
+                entry['slowest'] = duration
+                entry['example'] = [sql, list(params or ())]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                key: {**entry, 'samples': list(entry['samples']),
+                      'views': dict(entry['views']),
+                      'fields': dict(entry['fields'])}
+                for key, entry in self.entries.items()}
+
+    @staticmethod
+    def merge(snapshots):
+        """Сводка по отпечаткам из снимков всех воркеров."""
+        merged = {}
+        for snapshot in snapshots:
+            for key, entry in snapshot.items():
+                total = merged.setdefault(key, new_entry())
+                total['count'] += entry['count']
+                total['total'] += entry['total']
+                total['samples'].extend(entry['samples'])
+                total['views'].update(entry['views'])
+                total['fields'].update(entry['fields'])
+                if entry['slowest'] >= total['slowest']:
+                    total['slowest'] = entry['slowest']
+                    total['example'] = entry['example']
+        for entry in merged.values():
+            entry['p95'] = percentile(entry.pop('samples'), 0.95)
+        return merged
+
+
+slow_query_log = SlowQueryLog()
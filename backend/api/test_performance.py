@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from io import StringIO
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+PERFORMANCE_REPORT = os.getenv('PERFORMANCE_REPORT')
+PAGE_SIZES = (1, 5, 20)
+TIMING_REPEAT = 3
+
+# Страницы: число запросов не зависит от размера страницы и данных.
+PAGED_BUDGETS = {
+    'recipes': ('/api/recipes/?limit={limit}', 6),
+    'recipes_by_tags': (
+        '/api/recipes/?limit={limit}&tags=breakfast&tags=lunch', 7),
+    'recipes_favorited': ('/api/recipes/?limit={limit}&is_favorited=1', 6),
+    'recipes_in_cart': (
+        '/api/recipes/?limit={limit}&is_in_shopping_cart=1', 6),
+    'recipes_by_author': ('/api/recipes/?limit={limit}&author={author}', 7),
+    'recipes_cursor': ('/api/recipes/?limit={limit}&cursor=', 5),
+    'users': ('/api/users/?limit={limit}', 4),
+    'subscriptions': (
+        '/api/users/subscriptions/?limit={limit}&recipes_limit=3', 5),
+}
+DETAIL_BUDGETS = {
+    'recipe_detail': ('/api/recipes/{recipe}/', 5),
+    'short_link': ('/api/recipes/s/{short_code}/', 6),
+    'user_detail': ('/api/users/{author}/', 3),
+    'tags': ('/api/tags/', 1),
+    'ingredients_search': ('/api/ingredients/?name=са', 1),
+    'shopping_list_txt': (
+        '/api/recipes/download_shopping_cart/?format=txt', 2),
+    'shopping_list_pdf': (
+        '/api/recipes/download_shopping_cart/?format=pdf', 3),
+}
+# Переключатели: добавление и удаление.
+TOGGLE_BUDGETS = {
+    'favorite': ('/api/recipes/{other_recipe}/favorite/', 7),
+    'shopping_cart': ('/api/recipes/{other_recipe}/shopping_cart/', 7),
+    'subscribe': ('/api/users/{other_author}/subscribe/', 8),
+}
+
+report = {}
+
+
+class PerformanceBudgetMixin:
+    """Бюджеты запросов к БД на горячих путях API и отчет о времени.
+
+    Кеши очищаются перед каждым запросом, поэтому замеряется холодный
+    путь. Время пишется в JSON по пути из PERFORMANCE_REPORT.
+    """
+
+    SEED_OPTIONS = ()
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_scale', *cls.SEED_OPTIONS, stdout=StringIO())
+        cls.user = User.objects.get(username='seed_0')
+        authors = User.objects.exclude(id=cls.user.id).order_by(
+            '-recipes_count', 'id')
+        Follow.objects.filter(user=cls.user).delete()
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, following=author)
+            for author in authors[:max(PAGE_SIZES)])
+        recipes = Recipe.objects.exclude(author=cls.user).order_by('id')
+        for model in (FavoriteRecipe, ShoppingCart):
+            model.objects.filter(user=cls.user).delete()
+            model.objects.bulk_create(
+                model(user=cls.user, recipe=recipe)
+                for recipe in recipes[:max(PAGE_SIZES)])
+        other_recipe = recipes.exclude(
+            favorite_recipes__user=cls.user).exclude(
+            shopping_carts__user=cls.user).first()
+        recipe = recipes.first()
+        cls.url_kwargs = {
+            'author': authors[0].id,
+            'other_author': authors.exclude(
+                following__user=cls.user).first().id,
+            'recipe': recipe.id,
+            'short_code': recipe.url_link,
+            'other_recipe': other_recipe.id,
+        }
+        cls.token = Token.objects.create(user=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if PERFORMANCE_REPORT:
+            with open(PERFORMANCE_REPORT, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2,
+                          sort_keys=True)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def request(self, method, url, repeat):
+        """Число запросов и лучшее время холодного запроса в мс."""
+        timings = []
+        for _ in range(repeat):
+            cache.clear()
+            caches['documents'].clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = getattr(self.client, method)(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.assertLess(response.status_code, 400, url)
+        return len(context), min(timings)
+
+    def check(self, name, method, url, budget, repeat=TIMING_REPEAT):
+        queries, elapsed = self.request(
+            method, url.format(**self.url_kwargs), repeat)
+        report.setdefault(type(self).__name__, {})[name] = {
+            'queries': queries, 'ms': round(elapsed, 2)}
+        self.assertLessEqual(queries, budget, name)
+        return queries
+
+    def test_paged_endpoints(self):
+        for name, (url, budget) in PAGED_BUDGETS.items():
+            with self.subTest(name):
+                counts = {
+                    self.check(f'{name}[{limit}]', 'get',
+                               url.replace('{limit}', str(limit)), budget)
+                    for limit in PAGE_SIZES}
+                self.assertEqual(len(counts), 1, f'{name}: N+1')
+
+    def test_detail_endpoints(self):
+        for name, (url, budget) in DETAIL_BUDGETS.items():
+            with self.subTest(name):
+                self.check(name, 'get', url, budget)
+
+    def test_toggle_endpoints(self):
+        for name, (url, budget) in TOGGLE_BUDGETS.items():
+            with self.subTest(name):
+                self.check(f'{name}_add', 'post', url, budget, repeat=1)
+                self.check(f'{name}_remove', 'delete', url, budget, repeat=1)
+
+
+class SmallDatasetPerformanceTestCase(PerformanceBudgetMixin, TestCase):
+    SEED_OPTIONS = ('--users', '30', '--recipes', '60')
+
+
+class LargeDatasetPerformanceTestCase(PerformanceBudgetMixin, TestCase):
+    SEED_OPTIONS = ('--users', '100', '--recipes', '600')
@@ -1,6 +1,42 @@
+import json
 from http import HTTPStatus
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIRequestFactory
+
+from api.cache import (INGREDIENTS_TABLE, RECIPES_TABLE, RECIPES_VERSION_KEY,
+                       TAGS_TABLE, bump_table_version, get_versions,
+                       recipe_version_key, table_version_key,
+                       user_version_key)
+from api.jobs import (DOCUMENT_JOB_LEASE, LEASE_EXPIRED_ERROR,
+                      claim_document_job, enqueue_document_job)
+from api.metrics import metrics_registry
+from api.serializers import RecipeCreateUpdateSerializer
+from api.models import DocumentJob
+from api.slow_queries import fingerprint, slow_query_log
+from api.pagination import MAX_PAGE_SIZE, PagePagination
+from api.pdf import create_pdf
+from api.shopping_list import IngredientInfo, get_shopping_list
+from api.warmup import warm_up_reference_responses
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Follow, User
+
+PNG_IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==')
 
 
 class FoodGramAPITestCase(TestCase):
@@ -16,3 +52,871 @@ class FoodGramAPITestCase(TestCase):
         """Проверка доступности списка users."""
         response = self.guest_client.get('/api/users/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class RecipeListTestCase(TestCase):
+    """Список рецептов: запросы к БД и пагинация."""
+
+    RECIPES_COUNT = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Reader', last_name='Reader', password='pass')
+        authors = [
+            User.objects.create_user(
+                email=f'author{i}@foodgram.ru', username=f'author{i}',
+                first_name='Author', last_name='Author', password='pass')
+            for i in range(3)
+        ]
+        Follow.objects.create(user=cls.user, following=authors[0])
+        tags = [Tag.objects.create(name=f'Тэг {i}', slug=f'tag{i}')
+                for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        ]
+        for i in range(cls.RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=10,
+                image='recipes/test.png')
+            recipe.tags.set(tags[:i % len(tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients
+            )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.auth_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context)
+
+    def test_recipe_list_query_count(self):
+        """Список рецептов загружается за фиксированное число запросов."""
+        for client in (self.guest_client, self.auth_client):
+            with self.subTest(client=client):
+                small = self.count_queries(client, '/api/recipes/?limit=2')
+                large = self.count_queries(
+                    client, f'/api/recipes/?limit={self.RECIPES_COUNT}')
+                self.assertEqual(small, large)
+
+    def test_recipe_list_query_budget(self):
+        """Список рецептов гостя: count, рецепты, тэги, ингредиенты."""
+        with self.assertNumQueries(4):
+            response = self.guest_client.get(
+                f'/api/recipes/?limit={self.RECIPES_COUNT}')
+        self.assertEqual(
+            len(response.json()['results']), self.RECIPES_COUNT)
+
+    def test_recipe_list_cursor_pagination(self):
+        """Курсор обходит все рецепты без COUNT и без дублей."""
+        url = '/api/recipes/?cursor=&limit=5'
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.guest_client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertFalse(any(
+                'COUNT(' in query['sql'] for query in context))
+            self.assertNotIn('count', response.json())
+            seen.extend(item['id'] for item in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(seen, list(
+            Recipe.objects.values_list('id', flat=True)))
+
+    def test_limit_is_capped(self):
+        """Размер страницы ограничен сверху."""
+        request = Request(
+            APIRequestFactory().get('/api/recipes/', {'limit': 100000}))
+        self.assertEqual(
+            PagePagination().get_page_size(request), MAX_PAGE_SIZE)
+
+    def test_recipe_representation_cache(self):
+        """Повторный список берется из кеша и сбрасывается при правке."""
+        url = f'/api/recipes/?limit={self.RECIPES_COUNT}'
+        self.guest_client.get(url)
+        with self.assertNumQueries(2):
+            self.guest_client.get(url)
+        recipe = Recipe.objects.filter(
+            author__following__user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.clear()
+        response = self.auth_client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.json()['tags'], [])
+        self.assertTrue(response.json()['author']['is_subscribed'])
+
+    def test_invalidation_after_commit(self):
+        """Версии меняются только после коммита правки."""
+        recipe = Recipe.objects.first()
+        keys = [RECIPES_VERSION_KEY, recipe_version_key(recipe.id),
+                table_version_key(RECIPES_TABLE),
+                table_version_key(TAGS_TABLE), user_version_key(self.user.id)]
+        before = get_versions(keys)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            recipe.name = 'Новое имя'
+            recipe.save()
+            recipe.tags.clear()
+            RecipeIngredient.objects.filter(recipe=recipe).delete()
+            Tag.objects.create(name='Новый тэг', slug='new')
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+            self.assertEqual(get_versions(keys), before)
+        self.assertTrue(callbacks)
+        self.assertTrue(all(
+            old != new for old, new in zip(before, get_versions(keys))))
+
+    def test_conditional_get(self):
+        """Неизменившийся ответ отдается как 304, правка меняет ETag."""
+        url = '/api/recipes/'
+        etag = self.auth_client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRecipe.objects.create(
+                user=self.user, recipe=Recipe.objects.first())
+        response = self.auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        etag = self.guest_client.get('/api/tags/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_counters(self):
+        """Счетчики ведутся при изменениях и пересчитываются командой."""
+        author = User.objects.get(username='author0')
+        self.assertEqual(author.recipes_count, author.recipes.count())
+        recipe = author.recipes.first()
+        response = self.auth_client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.auth_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        response = self.auth_client.get('/api/users/subscriptions/')
+        self.assertEqual(response.json()['results'][0]['recipes_count'],
+                         author.recipes_count)
+        User.objects.update(recipes_count=0)
+        call_command('recalculate_counters', stdout=StringIO())
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, author.recipes.count())
+
+    def test_subscriptions_query_count(self):
+        """Подписки с превью рецептов грузятся за фиксированное число."""
+        for author in User.objects.filter(username__startswith='author'):
+            Follow.objects.get_or_create(user=self.user, following=author)
+        url = '/api/users/subscriptions/?recipes_limit=2'
+        with CaptureQueriesContext(connection) as context:
+            response = self.auth_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        for author in response.json()['results']:
+            self.assertEqual(len(author['recipes']), 2)
+        self.assertEqual(
+            len(context),
+            self.count_queries(self.auth_client, url + '&limit=1'))
+
+    def test_tags_filter(self):
+        """Фильтр по нескольким тэгам без дублей рецептов."""
+        response = self.guest_client.get(
+            f'/api/recipes/?tags=tag1&tags=tag2&limit={self.RECIPES_COUNT}')
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(Recipe.objects.filter(
+            tags__slug__in=('tag1', 'tag2')).values_list('id', flat=True)))
+        response = self.guest_client.get('/api/recipes/?tags=unknown')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_short_links(self):
+        """Коды из pk уникальны, разрешение кода кешируется."""
+        codes = set(Recipe.objects.values_list('url_link', flat=True))
+        self.assertEqual(len(codes), self.RECIPES_COUNT)
+        recipe = Recipe.objects.first()
+        Recipe.objects.filter(pk=recipe.pk).update(url_link='legacy01')
+        url = '/api/recipes/s/legacy01/'
+        first = self.count_queries(self.auth_client, url)
+        cache.delete('recipe_repr:version')
+        self.assertLess(self.count_queries(self.auth_client, url), first)
+        self.assertEqual(
+            self.auth_client.get(url).json()['id'], recipe.id)
+        Recipe.objects.filter(pk=recipe.pk).update(url_link='legacy02')
+        response = self.auth_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class RecipeUserFlagsTestCase(TestCase):
+    """is_favorited и is_in_shopping_cart из аннотаций queryset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='flags@foodgram.ru', username='flags',
+            first_name='Flags', last_name='Flags', password='pass')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10, image='recipes/test.png')
+            for i in range(3)]
+        FavoriteRecipe.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_flags(self, client):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        flags = {
+            recipe['id']: (recipe['is_favorited'],
+                           recipe['is_in_shopping_cart'])
+            for recipe in response.json()['results']}
+        return flags, [query['sql'] for query in context.captured_queries]
+
+    def test_anonymous_flags_without_subqueries(self):
+        """Гость получает False без подзапросов к избранному и корзине."""
+        flags, queries = self.get_flags(Client())
+        self.assertEqual(set(flags.values()), {(False, False)})
+        for model in (FavoriteRecipe, ShoppingCart):
+            self.assertFalse(any(
+                model._meta.db_table in sql for sql in queries))
+
+    def test_user_flags_annotated(self):
+        """Флаги юзера приходят из EXISTS в запросе рецептов."""
+        flags, queries = self.get_flags(
+            Client(HTTP_AUTHORIZATION=f'Token {self.token.key}'))
+        self.assertEqual(flags, {
+            self.recipes[0].id: (True, False),
+            self.recipes[1].id: (False, True),
+            self.recipes[2].id: (False, False),
+        })
+        for model in (FavoriteRecipe, ShoppingCart):
+            self.assertEqual(sum(
+                model._meta.db_table in sql for sql in queries), 1)
+
+
+class UserSubscribedFlagTestCase(TestCase):
+    """is_subscribed из множества подписок, собранного раз на запрос."""
+
+    USERS_COUNT = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{i}@foodgram.ru', username=f'user{i}',
+                first_name='User', last_name='User', password='pass')
+            for i in range(cls.USERS_COUNT)]
+        cls.reader = cls.users[0]
+        cls.followed = {cls.users[1].id, cls.users[3].id}
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, following_id=user_id)
+            for user_id in cls.followed)
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def get_users(self, client, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(f'/api/users/?limit={limit}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        follow_queries = [
+            query['sql'] for query in context.captured_queries
+            if Follow._meta.db_table in query['sql']]
+        # Для множества id не нужны ни JOIN, ни сортировка.
+        for sql in follow_queries:
+            self.assertNotIn('JOIN', sql)
+            self.assertNotIn('ORDER BY', sql)
+        return response.json()['results'], len(follow_queries)
+
+    def test_follow_flags_single_query(self):
+        """Один запрос подписок на любом размере страницы."""
+        client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for limit in (1, self.USERS_COUNT):
+            with self.subTest(limit=limit):
+                users, follow_queries = self.get_users(client, limit)
+                self.assertEqual(len(users), limit)
+                self.assertEqual(follow_queries, 1)
+                for user in users:
+                    self.assertEqual(user['is_subscribed'],
+                                     user['id'] in self.followed)
+
+    def test_anonymous_without_follow_query(self):
+        users, follow_queries = self.get_users(Client(), self.USERS_COUNT)
+        self.assertEqual(follow_queries, 0)
+        self.assertFalse(any(user['is_subscribed'] for user in users))
+
+
+class RecipeUpdateTestCase(TestCase):
+    """Правка рецепта: ингредиенты и тэги меняются разницей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='editor@foodgram.ru', username='editor',
+            first_name='Editor', last_name='Editor', password='pass')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tags = [Tag.objects.create(name=f'Тэг {i}', slug=f'tag{i}')
+                    for i in range(2)]
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/test.png')
+        cls.recipe.tags.set(cls.tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=cls.recipe, amount=i + 1,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {i}', measurement_unit='г'))
+            for i in range(3))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_update_applies_diff(self):
+        """PATCH меняет только отличающиеся строки ингредиентов и тэгов."""
+        recipe = self.recipe
+        rows = list(recipe.recipe_ingredient_set.order_by('ingredient_id'))
+        new_ingredient = Ingredient.objects.create(
+            name='Новый ингредиент', measurement_unit='г')
+        new_tag = Tag.objects.create(name='Новый тэг', slug='new')
+        ingredients = [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in rows[1:]]
+        ingredients[0]['amount'] += 1
+        ingredients.append({'id': new_ingredient.id, 'amount': 7})
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': ingredients,
+             'tags': [self.tags[0].id, new_tag.id]},
+            content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        updated = {
+            row.ingredient_id: row
+            for row in recipe.recipe_ingredient_set.all()}
+        self.assertNotIn(rows[0].ingredient_id, updated)
+        for row in rows[1:]:
+            self.assertEqual(updated[row.ingredient_id].pk, row.pk)
+        self.assertEqual(updated[rows[1].ingredient_id].amount,
+                         rows[1].amount + 1)
+        self.assertEqual(updated[new_ingredient.id].amount, 7)
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {self.tags[0].id, new_tag.id})
+        self.assertIn(
+            new_ingredient.id,
+            [item['id'] for item in response.json()['ingredients']])
+
+
+class RecipeUpdateCacheTestCase(TransactionTestCase):
+    """Ответ PATCH и следующие GET видят правку, а не кеш до нее."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            email='cached@foodgram.ru', username='cached',
+            first_name='Cached', last_name='Cached', password='pass')
+        self.tags = [Tag.objects.create(name=f'Тэг {i}', slug=f'tag{i}')
+                     for i in range(2)]
+        self.ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/test.png')
+        self.recipe.tags.set(self.tags[:1])
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=1)
+        self.client = Client(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.create(user=author).key}'))
+
+    def test_patch_response_not_stale(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client.get(url)
+        keys = [recipe_version_key(self.recipe.id)]
+        before = get_versions(keys)
+
+        def check_not_bumped(*args):
+            # Внутри транзакции правки версия еще старая.
+            self.assertEqual(get_versions(keys), before)
+
+        with mock.patch.object(
+                RecipeCreateUpdateSerializer, 'update_ingredients',
+                side_effect=check_not_bumped):
+            response = self.client.patch(
+                url, {'name': 'Новое имя',
+                      'tags': [tag.id for tag in self.tags],
+                      'ingredients': [{'id': self.ingredient.id,
+                                       'amount': 1}]},
+                content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(get_versions(keys), before)
+        for data in (response.json(), self.client.get(url).json()):
+            self.assertEqual(data['name'], 'Новое имя')
+            self.assertEqual(len(data['tags']), 2)
+
+
+class RecipeRelatedIdsTestCase(TestCase):
+    """Id ингредиентов и тэгов рецепта проверяются пачкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='writer@foodgram.ru', username='writer',
+            first_name='Writer', last_name='Writer', password='pass')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tags = [Tag.objects.create(name=f'Тэг {i}', slug=f'tag{i}')
+                    for i in range(3)]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Пакетный {i}', measurement_unit='г')
+            for i in range(30))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def test_create_resolves_related_ids_in_bulk(self):
+        """Ингредиенты и тэги достаются одним запросом на поле, все
+        неизвестные id возвращаются одной ошибкой."""
+        data = {
+            'ingredients': [{'id': ingredient.id, 'amount': 2}
+                            for ingredient in self.ingredients],
+            'tags': [tag.id for tag in self.tags],
+            'name': 'Большой рецепт', 'text': 'Описание',
+            'cooking_time': 5, 'image': PNG_IMAGE,
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                '/api/recipes/', data, content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        for table in ('recipes_ingredient', 'recipes_tag'):
+            self.assertEqual(sum(
+                f'FROM "{table}" WHERE' in query['sql']
+                for query in context.captured_queries), 1, table)
+        data['ingredients'] += [{'id': 100500, 'amount': 1},
+                                {'id': 100501, 'amount': 1}]
+        data['tags'].append(100502)
+        response = self.client.post(
+            '/api/recipes/', data, content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('100500, 100501',
+                      response.json()['ingredients']['id'][0])
+        self.assertIn('100502', response.json()['tags'][0])
+
+    def test_partial_update_without_ingredient_id(self):
+        """PATCH с ингредиентом без id — ошибка валидации, а не 500."""
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/test.png')
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'amount': 5}], 'tags': [self.tags[0].id]},
+            content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('id', response.json()['ingredients'])
+
+
+class IngredientSearchTestCase(TestCase):
+    """Поиск ингредиентов по началу имени."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('сахарная пудра', 'сахар', 'соль', 'Сахарин'))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_prefix_search(self):
+        """Точное совпадение первым, регистр не важен."""
+        response = self.guest_client.get('/api/ingredients/?name=Сахар')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()],
+            ['сахар', 'Сахарин', 'сахарная пудра'])
+
+    def test_detail_ignores_search(self):
+        """Параметр name не ломает получение ингредиента по id."""
+        ingredient = Ingredient.objects.get(name='соль')
+        response = self.guest_client.get(
+            f'/api/ingredients/{ingredient.id}/?name=со')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['name'], 'соль')
+
+    def test_index_refreshed_on_change(self):
+        """Индекс перестраивается после изменения ингредиентов."""
+        self.guest_client.get('/api/ingredients/?name=со')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='соус', measurement_unit='мл')
+        with self.assertNumQueries(1):
+            response = self.guest_client.get('/api/ingredients/?name=со')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()],
+            ['соль', 'соус'])
+
+    def test_load_ingredients(self):
+        """Загрузка пачками из CSV и JSON, повторный запуск ничего не
+        добавляет, а поиск видит новые ингредиенты."""
+        self.guest_client.get('/api/ingredients/?name=со')
+        with TemporaryDirectory() as directory:
+            csv_path = f'{directory}/ingredients.csv'
+            json_path = f'{directory}/ingredients.json'
+            with open(csv_path, 'w', encoding='utf-8') as file:
+                file.write('соль,г\nсоус,мл\nсоус,мл\nсода,г\n')
+            with open(json_path, 'w', encoding='utf-8') as file:
+                json.dump([{'name': 'соус', 'measurement_unit': 'мл'},
+                           {'name': 'сок', 'measurement_unit': 'мл'}], file)
+            for path in (csv_path, json_path, csv_path):
+                stderr = StringIO()
+                with self.captureOnCommitCallbacks(execute=True):
+                    call_command('load_ingredients', path, '--batch-size',
+                                 '2', stdout=StringIO(), stderr=stderr)
+        self.assertEqual(Ingredient.objects.count(), 7)
+        # Повторный запуск ничего не добавил, перезапуск не нужен.
+        self.assertEqual(stderr.getvalue(), '')
+        with TemporaryDirectory() as directory:
+            path = f'{directory}/ingredients.csv'
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('сироп,мл\n')
+            call_command('load_ingredients', path, stdout=StringIO(),
+                         stderr=stderr)
+        self.assertIn('перезапуска', stderr.getvalue())
+        response = self.guest_client.get('/api/ingredients/?name=со')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()],
+            ['сода', 'сок', 'соль', 'соус'])
+
+
+class ReferenceResponsesTestCase(TestCase):
+    """Справочники отдаются из памяти процесса без запросов к БД."""
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+
+    def test_prerendered_tags(self):
+        warm_up_reference_responses()
+        with self.assertNumQueries(0):
+            response = self.guest_client.get('/api/tags/')
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(len(response.json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', slug='lunch')
+        self.assertEqual(len(self.guest_client.get('/api/tags/').json()), 2)
+
+    def test_warm_up_before_load(self):
+        """Прогретый пустой справочник сменяется после смены версии,
+        как после load_ingredients в другом процессе."""
+        warm_up_reference_responses()
+        self.assertEqual(self.guest_client.get('/api/ingredients/').json(), [])
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='соль', measurement_unit='г')])
+        bump_table_version(INGREDIENTS_TABLE)
+        self.assertEqual(
+            len(self.guest_client.get('/api/ingredients/').json()), 1)
+
+
+class ShoppingListTestCase(TestCase):
+    """Список покупок собирается одним запросом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='buyer@foodgram.ru', username='buyer',
+            first_name='Buyer', last_name='Buyer', password='pass')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        salt_pinch = Ingredient.objects.create(
+            name='соль', measurement_unit='щепотка')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        for amounts in ((5, 1, 200), (10, 2, 300)):
+            recipe = Recipe.objects.create(
+                author=cls.user, name='Рецепт', text='Описание',
+                cooking_time=10, image='recipes/test.png')
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=amount)
+                for ingredient, amount in zip(
+                    (salt, salt_pinch, milk), amounts))
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def test_totals_by_name_and_unit(self):
+        with self.assertNumQueries(1):
+            shopping_list = get_shopping_list(self.user)
+        self.assertEqual(shopping_list, [
+            IngredientInfo('молоко', 'мл', 500),
+            IngredientInfo('соль', 'г', 15),
+            IngredientInfo('соль', 'щепотка', 3),
+        ])
+
+    def test_pdf_paginated(self):
+        """Длинный список разбивается на страницы."""
+        content = create_pdf(
+            [IngredientInfo(f'ингредиент {i}', 'г', i) for i in range(100)]
+        ).read()
+        self.assertGreater(content.count(b'/Type /Page\n'), 1)
+
+    def test_download_cached_by_cart_version(self):
+        """Повторная выгрузка из кеша, правка рецепта в корзине сбрасывает."""
+        cache.clear()
+        client = Client(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.create(user=self.user).key}'))
+        url = '/api/recipes/download_shopping_cart/'
+        content = b''.join(client.get(url).streaming_content)
+        with mock.patch('api.exporters.create_pdf') as create_pdf_mock:
+            cached = b''.join(client.get(url).streaming_content)
+        create_pdf_mock.assert_not_called()
+        self.assertEqual(cached, content)
+        recipe_ingredient = RecipeIngredient.objects.first()
+        recipe_ingredient.amount += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe_ingredient.save()
+        with mock.patch('api.exporters.create_pdf',
+                        wraps=create_pdf) as create_pdf_mock:
+            client.get(url)
+        create_pdf_mock.assert_called_once()
+
+    def test_documents_cache_evicts_one_lru(self):
+        """Переполнение вытесняет один давно не читанный документ."""
+        documents = caches['documents']
+        documents.clear()
+        for i in range(documents._max_entries):
+            documents.set(f'document:{i}', b'x')
+        documents.get('document:0')
+        documents.set('document:new', b'x')
+        self.assertIsNotNone(documents.get('document:0'))
+        self.assertIsNone(documents.get('document:1'))
+        self.assertIsNotNone(documents.get('document:2'))
+        documents.clear()
+
+    def test_download_formats(self):
+        """Текстовые форматы выгрузки, PDF по умолчанию."""
+        client = Client(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.create(user=self.user).key}'))
+        url = '/api/recipes/download_shopping_cart/'
+        self.assertEqual(client.get(url)['Content-Type'], 'application/pdf')
+        for document_format in ('pdf', 'txt', 'csv', 'json'):
+            self.assertEqual(
+                client.get(url, {'format': document_format})[
+                    'Content-Disposition'],
+                f'attachment; filename="ingredients_list.{document_format}"')
+        response = client.get(url, {'format': 'csv'})
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            ['name,measurement_unit,total_amount', 'молоко,мл,500',
+             'соль,г,15', 'соль,щепотка,3'])
+        response = client.get(url, {'format': 'json'})
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content))[0],
+            {'name': 'молоко', 'measurement_unit': 'мл',
+             'total_amount': 500})
+        response = client.get(url, {'format': 'txt'})
+        self.assertIn('Соль (г): 15',
+                      b''.join(response.streaming_content).decode())
+        response = client.get(url, {'format': 'docx'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_background_render(self):
+        """Фоновый рендер: 202 и ссылка, воркер, затем файл."""
+        client = Client(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.create(user=self.user).key}'))
+        url = '/api/recipes/download_shopping_cart/'
+        with TemporaryDirectory() as documents_root, override_settings(
+                DOCUMENTS_ROOT=documents_root):
+            response = client.get(url, {'format': 'csv', 'async': 1})
+            self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+            job = response.json()
+            self.assertEqual(
+                client.get(url, {'format': 'csv', 'async': 1}).json()['id'],
+                job['id'])
+            self.assertEqual(
+                client.get(job['url']).status_code, HTTPStatus.ACCEPTED)
+            call_command('render_documents', '--once', stdout=StringIO())
+            response = client.get(job['url'])
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertIn(
+                'соль,г,15',
+                b''.join(response.streaming_content).decode())
+            response.close()
+        response = client.get(url, {'format': 'csv', 'async': 0})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(DocumentJob.objects.count(), 1)
+
+    def test_stale_running_job(self):
+        """Задачу упавшего воркера не переиспользуют, воркер ее роняет."""
+        job = enqueue_document_job(self.user, 'csv')
+        self.assertEqual(claim_document_job(), job)
+        self.assertEqual(enqueue_document_job(self.user, 'csv'), job)
+        DocumentJob.objects.filter(id=job.id).update(
+            started=timezone.now() - DOCUMENT_JOB_LEASE * 2)
+        new_job = enqueue_document_job(self.user, 'csv')
+        self.assertNotEqual(new_job, job)
+        self.assertEqual(claim_document_job(), new_job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DocumentJob.FAILED)
+        self.assertEqual(job.error, LEASE_EXPIRED_ERROR)
+
+
+class SeedScaleTestCase(TestCase):
+    """Генератор синтетических данных."""
+
+    def seed(self, *args):
+        stderr = StringIO()
+        call_command('seed_scale', '--users', '30', '--recipes', '120',
+                     *args, stdout=StringIO(), stderr=stderr)
+        # Кеш тестов в памяти процесса: предупреждение один раз.
+        self.assertEqual(stderr.getvalue().count('перезапуска'), 1)
+        return (
+            list(User.objects.order_by('username').values_list(
+                'username', 'recipes_count')),
+            list(Recipe.objects.order_by('name').values_list(
+                'name', 'author__username', 'favorites_count',
+                'in_carts_count')),
+            RecipeIngredient.objects.count(),
+        )
+
+    def test_seed_is_deterministic(self):
+        """Один seed — одни и те же данные, авторы распределены неровно."""
+        users, recipes, rows = self.seed()
+        self.assertEqual(len(recipes), 120)
+        self.assertEqual(self.seed('--clear'), (users, recipes, rows))
+        self.assertNotEqual(self.seed('--clear', '--seed', '1')[1], recipes)
+        counts = sorted(count for _, count in users)
+        self.assertGreater(counts[-1], 4 * counts[len(counts) // 2])
+
+
+class ServerTimingTestCase(TestCase):
+    """Замеры запросов в Server-Timing и логе api.timing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='timing@foodgram.ru', username='timing',
+            first_name='Timing', last_name='Timing', password='pass')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        """Server-Timing и строка лога с вьюсетом и экшеном."""
+        with override_settings(PERFORMANCE_TIMING=True):
+            client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            with self.assertLogs('api.timing') as logs:
+                response = client.get('/api/users/subscriptions/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+, serialize;dur=[\d.]+, render;dur=[\d.]+, '
+            r'queries;desc="\d+", total;dur=[\d.]+$')
+        # Время сериализаторов пишет миксин, DRF не патчится.
+        self.assertEqual(BaseSerializer.data.fget.__module__,
+                         'rest_framework.serializers')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'UserViewSet.subscriptions')
+        self.assertGreater(record['queries'], 0)
+        with override_settings(PERFORMANCE_TIMING=True,
+                               PERFORMANCE_TIMING_SAMPLE_RATE=0):
+            response = Client().get('/api/recipes/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('Server-Timing', Client().get('/api/tags/'))
+
+
+class MetricsTestCase(TestCase):
+    """Метрики в формате Prometheus."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@foodgram.ru', username='admin', first_name='Admin',
+            last_name='Admin', password='pass', is_staff=True)
+        cls.token = Token.objects.create(user=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_metrics_admin_only(self):
+        response = Client().get('/api/metrics/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_metrics_aggregated_across_workers(self):
+        """Снимки других воркеров из METRICS_DIR суммируются."""
+        labels = [['method', 'GET'], ['status', 200],
+                  ['view', 'TagViewSet.list']]
+        with TemporaryDirectory() as metrics_dir, override_settings(
+                METRICS_DIR=metrics_dir):
+            self.client.get('/api/tags/')
+            own = metrics_registry.collect()[0][
+                'requests_total', tuple(map(tuple, labels))]
+            with open(f'{metrics_dir}/0.metrics.json', 'w') as file:
+                json.dump({'counters': [['requests_total', labels, 5]],
+                           'histograms': []}, file)
+            response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        content = response.content.decode()
+        self.assertIn(
+            'foodgram_requests_total{method="GET",status="200",'
+            f'view="TagViewSet.list"}} {int(own) + 5}\n', content)
+        self.assertIn(
+            'foodgram_request_duration_seconds_bucket'
+            '{view="TagViewSet.list",le="+Inf"}', content)
+        self.assertIn(
+            'foodgram_cache_requests_total{cache="prerendered",'
+            'result="miss"}', content)
+
+    def test_slow_queries(self):
+        """Отпечатки запросов с вьюсетом и полем сериализатора."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)\n"
+                        "AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?')
+        with TemporaryDirectory() as metrics_dir, override_settings(
+                METRICS_DIR=metrics_dir, SLOW_QUERY_THRESHOLD_MS=0,
+                PERFORMANCE_TIMING=True):
+            Client(HTTP_AUTHORIZATION=f'Token {self.token.key}').get(
+                f'/api/users/{self.admin.id}/')
+            slow_query_log.flush(force=True)
+            out = StringIO()
+            call_command('slow_queries', '--order-by', 'count', stdout=out)
+        self.assertIn('UserViewSet.retrieve', out.getvalue())
+        self.assertIn('UserSerializer.is_subscribed', out.getvalue())
+        # Поля по одному дают тот же ответ, что и обычный вывод DRF.
+        client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        url = f'/api/users/{self.admin.id}/'
+        plain = client.get(url).json()
+        with override_settings(PERFORMANCE_TIMING=True):
+            self.assertEqual(Client(HTTP_AUTHORIZATION=(
+                f'Token {self.token.key}')).get(url).json(), plain)
+        # Без замеров запросы не пишутся.
+        slow_query_log.entries.clear()
+        with mock.patch('api.middleware.slow_query_log.record') as record, \
+                override_settings(SLOW_QUERY_THRESHOLD_MS=0):
+            for timing, sample_rate in ((False, 1), (True, 0)):
+                with override_settings(
+                        PERFORMANCE_TIMING=timing,
+                        PERFORMANCE_TIMING_SAMPLE_RATE=sample_rate):
+                    Client(HTTP_AUTHORIZATION=f'Token {self.token.key}').get(
+                        f'/api/users/{self.admin.id}/')
+        record.assert_not_called()
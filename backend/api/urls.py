@@ -10,6 +10,7 @@ from .views import (
     TagViewSet,
     RecipeViewSet,
     IngredientViewSet,
+    MetricsView,
     RecipeByShortCodeDetailView)
 
 
@@ -30,6 +31,7 @@ urlpatterns = [
     path('', include(v1_router.urls)),
     path('recipes/s/<str:short_code>/',
          RecipeByShortCodeDetailView.as_view(), name='short_code'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path("schema/", SpectacularAPIView.as_view(),
          name="schema"),
     path("schema/redoc/", SpectacularRedocView.as_view(
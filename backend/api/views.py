@@ -1,11 +1,17 @@
-from django.http import JsonResponse
+from django.db.models import Prefetch
+from django.http import (FileResponse, HttpResponse, JsonResponse,
+                         StreamingHttpResponse)
+from django.utils.http import content_disposition_header
+from drf_spectacular.utils import extend_schema
 from rest_framework.generics import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.fields import BooleanField
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.generics import RetrieveAPIView
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
@@ -15,8 +21,12 @@ from users.models import User
 from recipes.models import (
     Tag, Ingredient, Recipe,
     FavoriteRecipe, ShoppingCart)
+from .cache import (INGREDIENTS_TABLE, RECIPES_TABLE, TAGS_TABLE,
+                    get_cached_document, get_cart_document_key,
+                    get_recipe_id_by_short_code, set_cached_document)
+from .mixins import ConditionalGetMixin, PrerenderedResponseMixin
 from .permissions import IsStaffOrIsAuthorOrReadOnly
-from .pagination import PagePagination
+from .pagination import PageOrCursorPagination
 from .serializers import (
     UserSerializer,
     AvatarSerializer,
@@ -28,22 +38,41 @@ from .serializers import (
     ShoppingCartSerializer,
     SubscriptionsSerializer,
     SubscribeSerializer,
+    DocumentJobSerializer,
 )
-from .pdf import create_ingredients_list, create_pdf
-
-
-class RecipeViewSet(ModelViewSet):
+from .exporters import ExportContentNegotiation, SHOPPING_LIST_EXPORTERS
+from .jobs import enqueue_document_job
+from .metrics import metrics_registry
+from .models import DocumentJob
+from .shopping_list import get_shopping_list
+
+
+def document_response(content, exporter):
+    """Документ на скачивание: файл или генератор строк экспортера."""
+    if hasattr(content, 'read'):
+        response = FileResponse(content, content_type=exporter.content_type)
+    else:
+        response = StreamingHttpResponse(
+            content, content_type=exporter.content_type)
+    response['Content-Disposition'] = content_disposition_header(
+        True, f'ingredients_list.{exporter.extension}')
+    return response
+
+
+class RecipeViewSet(ConditionalGetMixin, ModelViewSet):
     """Вьюсет рецептов favorit/ shopping_cart/ download_shopping_cart/"""
 
+    etag_tables = (RECIPES_TABLE,)
+    etag_per_user = True
     permission_classes = (IsStaffOrIsAuthorOrReadOnly,)
     http_method_names = ('get', 'post', 'patch', 'delete')
-    pagination_class = PagePagination
+    pagination_class = PageOrCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        return Recipe.objects.select_related(
-            'author').prefetch_related('ingredients', 'tags')
+        return Recipe.objects.select_related('author').with_user_flags(
+            self.request.user)
 
     def get_serializer_class(self, *args, **kwargs):
         if self.action in ('list', 'retrieve'):
@@ -105,25 +134,63 @@ class RecipeViewSet(ModelViewSet):
         return self.delete_method(ShoppingCart, request, pk)
 
     @action(methods=('get',), detail=False,
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            content_negotiation_class=ExportContentNegotiation)
     def download_shopping_cart(self, request):
-        final_list = create_ingredients_list(request)
-        pdf_response = create_pdf(final_list, "ingredients_list.pdf")
-        return pdf_response
+        document_format = request.query_params.get('format', 'pdf')
+        exporter = SHOPPING_LIST_EXPORTERS.get(document_format)
+        if exporter is None:
+            return Response(
+                {'format': 'Доступные форматы: {}'.format(
+                    ', '.join(SHOPPING_LIST_EXPORTERS))},
+                status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('async') in BooleanField.TRUE_VALUES:
+            job = enqueue_document_job(request.user, document_format)
+            return Response(
+                DocumentJobSerializer(job, context={'request': request}).data,
+                status=status.HTTP_202_ACCEPTED)
+        if not exporter.cacheable:
+            file = exporter.export(get_shopping_list(request.user))
+        else:
+            key = get_cart_document_key(request.user, exporter.extension)
+            file = get_cached_document(key)
+            if file is None:
+                file = exporter.export(get_shopping_list(request.user))
+                set_cached_document(key, file)
+        return document_response(file, exporter)
+
+    @action(methods=('get',), detail=False,
+            url_path=r'download_shopping_cart/jobs/(?P<job_id>[0-9]+)',
+            url_name='shopping-cart-job',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_job(self, request, job_id):
+        job = get_object_or_404(
+            DocumentJob, id=job_id, user=request.user)
+        if job.status != DocumentJob.DONE:
+            return Response(
+                DocumentJobSerializer(job, context={'request': request}).data,
+                status=(status.HTTP_200_OK
+                        if job.status == DocumentJob.FAILED
+                        else status.HTTP_202_ACCEPTED))
+        exporter = SHOPPING_LIST_EXPORTERS[job.document_format]
+        return document_response(job.file.open('rb'), exporter)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(PrerenderedResponseMixin, ReadOnlyModelViewSet):
     """Вьюсет ингредиентов."""
 
+    etag_tables = (INGREDIENTS_TABLE,)
+    authentication_classes = ()
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(PrerenderedResponseMixin, ReadOnlyModelViewSet):
     """Вьюсет тэгов."""
 
+    etag_tables = (TAGS_TABLE,)
+    authentication_classes = ()
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
@@ -134,7 +201,7 @@ class UserViewSet(DjoserUserViewSet):
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    pagination_class = PagePagination
+    pagination_class = PageOrCursorPagination
 
     @action(detail=True, methods=['post'],
             permission_classes=(IsAuthenticated,))
@@ -178,8 +245,13 @@ class UserViewSet(DjoserUserViewSet):
     @action(detail=False, methods=('get',),
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes[:int(recipes_limit)]
         queryset = User.objects.filter(
-            following__user=self.request.user)
+            following__user=self.request.user).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='preview_recipes'))
         pag = self.paginate_queryset(queryset)
         serializer = SubscriptionsSerializer(
             pag, context={'request': request}, many=True)
@@ -210,16 +282,35 @@ class UserViewSet(DjoserUserViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class RecipeByShortCodeDetailView(RetrieveAPIView):
+class RecipeByShortCodeDetailView(ConditionalGetMixin, RetrieveAPIView):
     """Вьюсет обработки короткой ссылки."""
 
+    etag_tables = (RECIPES_TABLE,)
+    etag_per_user = True
     serializer_class = RecipeReadSerializer
     lookup_field = 'url_link'
     lookup_url_kwarg = 'short_code'
 
     def get_queryset(self):
-        return Recipe.objects.all()
+        return Recipe.objects.select_related('author').with_user_flags(
+            self.request.user)
 
     def get_object(self):
         short_code = self.kwargs['short_code']
-        return get_object_or_404(Recipe, url_link=short_code)
+        recipe = get_object_or_404(
+            self.get_queryset(),
+            id=get_recipe_id_by_short_code(short_code), url_link=short_code)
+        self.check_object_permissions(self.request, recipe)
+        return recipe
+
+
+@extend_schema(exclude=True)
+class MetricsView(APIView):
+    """Метрики всех воркеров в формате Prometheus, только для админов."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            metrics_registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,34 @@
+import logging
+
+from django.db import DatabaseError
+from django.http import HttpRequest
+
+from .views import IngredientViewSet, TagViewSet
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_URLS = (
+    ('/api/tags/', TagViewSet),
+    ('/api/ingredients/', IngredientViewSet),
+)
+
+
+def get_request(path):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    return request
+
+
+def warm_up_reference_responses():
+    """Рендерит справочники при старте воркера, до первых запросов.
+
+    Ответ хранится по ETag с версией таблицы из общего кеша: загрузка
+    справочника из другого процесса меняет версию, и прогретый ответ
+    больше не отдается.
+    """
+    for url, viewset in WARM_UP_URLS:
+        try:
+            viewset.as_view({'get': 'list'})(get_request(url))
+        except DatabaseError:
+            logger.warning('Не удалось прогреть %s', url, exc_info=True)
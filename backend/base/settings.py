@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +53,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+PERFORMANCE_TIMING = os.getenv(
+    'PERFORMANCE_TIMING', 'False').lower() in ('true', '1', 't')
+PERFORMANCE_TIMING_SAMPLE_RATE = float(
+    os.getenv('PERFORMANCE_TIMING_SAMPLE_RATE', 1.0))
+METRICS_ENABLED = os.getenv(
+    'METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+METRICS_DIR = os.getenv('METRICS_DIR')
+# Медленные запросы пишутся только в замеряемых PERFORMANCE_TIMING
+# запросах.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_REPEAT_THRESHOLD = int(os.getenv('SLOW_QUERY_REPEAT_THRESHOLD', 10))
+
 ROOT_URLCONF = 'base.urls'
 
 TEMPLATES = [
@@ -84,6 +97,35 @@ DATABASES = {
     }
 }
 
+# Версии кеша лежат в default: LocMemCache годится только для одного
+# процесса, в docker-compose это Redis.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'documents': {
+        'BACKEND': os.getenv(
+            'DOCUMENTS_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DOCUMENTS_CACHE_LOCATION', 'documents'),
+        'TIMEOUT': 60 * 60 * 24,
+    },
+}
+# Документы в docker-compose лежат в общем Redis с maxmemory и
+# allkeys-lru. LocMemCache держит до MAX_ENTRIES документов по
+# DOCUMENT_CACHE_MAX_SIZE в каждом воркере и вытесняет по одному
+# давно не читанному.
+if CACHES['documents']['BACKEND'].endswith('LocMemCache'):
+    DOCUMENTS_CACHE_MAX_ENTRIES = int(
+        os.getenv('DOCUMENTS_CACHE_MAX_ENTRIES', 32))
+    CACHES['documents']['OPTIONS'] = {
+        'MAX_ENTRIES': DOCUMENTS_CACHE_MAX_ENTRIES,
+        'CULL_FREQUENCY': DOCUMENTS_CACHE_MAX_ENTRIES,
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,6 +158,8 @@ STATIC_ROOT = BASE_DIR / "collected_static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+DOCUMENTS_ROOT = os.getenv('DOCUMENTS_ROOT', BASE_DIR / 'documents')
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -152,3 +196,14 @@ SPECTACULAR_SETTINGS = {
 }
 
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', '').split()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {'handlers': ('console',), 'level': 'INFO'},
+    },
+}
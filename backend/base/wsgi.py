@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
 
 application = get_wsgi_application()
+
+from api.warmup import warm_up_reference_responses  # noqa: E402
+
+warm_up_reference_responses()
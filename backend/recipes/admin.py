@@ -35,7 +35,8 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'image', 'url_link')
+    list_display = ('id', 'name', 'author', 'image', 'url_link',
+                    'favorites_count', 'in_carts_count')
     list_display_links = ('id', 'name', 'author')
     list_filter = (
         'author',
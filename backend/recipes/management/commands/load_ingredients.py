@@ -1,19 +1,105 @@
 import csv
+import io
+import json
 import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import (INGREDIENTS_TABLE, LOCAL_CACHE_WARNING,
+                       bump_table_version, is_cache_shared)
 from recipes.models import Ingredient
 
+DEFAULT_PATH = os.path.join('data', 'ingredients.csv')
+BATCH_SIZE = 1000
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def bulk_insert(rows, batch_size):
+    """Вставка пачками, уже загруженные ингредиенты пропускаются."""
+    for batch in batches(rows, batch_size):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in batch),
+            ignore_conflicts=True)
+
+
+def copy_insert(rows, batch_size):
+    """COPY во временную таблицу и перенос без конфликтующих строк."""
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredients_import '
+            '(name varchar(128), measurement_unit varchar(64)) '
+            'ON COMMIT DROP')
+        for batch in batches(rows, batch_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY ingredients_import FROM STDIN WITH (FORMAT csv)',
+                buffer)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredients_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING')
+
 
 class Command(BaseCommand):
-    help = 'Загрузка CSV файлов.'
-
-    def handle(self, *args, **kwargs):
-        file_path = os.path.join('data', 'ingredients.csv')
-        with open(file_path, mode='r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for read in reader:
-                Ingredient.objects.create(
-                    name=read[0],
-                    measurement_unit=read[1])
+    help = ('Загрузка ингредиентов из CSV или JSON, повторный запуск '
+            'безопасен. Поиск сервера обновится только при общем кеше '
+            '(CACHE_BACKEND), иначе сервер нужно перезапустить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Файл .csv (имя, единица) или .json.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Строк в одном INSERT или COPY.')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Грузить через COPY, только PostgreSQL.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy работает только с PostgreSQL.')
+        insert = copy_insert if options['copy'] else bulk_insert
+        started = time.perf_counter()
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            before = Ingredient.objects.count()
+            insert(reader(file), options['batch_size'])
+            created = Ingredient.objects.count() - before
+            if created:
+                transaction.on_commit(
+                    lambda: bump_table_version(INGREDIENTS_TABLE))
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено ингредиентов: {created} '
+            f'за {time.perf_counter() - started:.2f} с.'))
+        if created and not is_cache_shared():
+            self.stderr.write(self.style.WARNING(LOCAL_CACHE_WARNING))
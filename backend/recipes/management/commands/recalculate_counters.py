@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import User
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()), 0)
+
+
+def recalculate_counters():
+    """Пересчитывает денормализованные счетчики с нуля."""
+    with transaction.atomic():
+        users = User.objects.update(
+            recipes_count=count_subquery(Recipe, 'author'))
+        recipes = Recipe.objects.update(
+            favorites_count=count_subquery(FavoriteRecipe, 'recipe'),
+            in_carts_count=count_subquery(ShoppingCart, 'recipe'))
+    return users, recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков рецептов, избранного и корзин.'
+
+    def handle(self, *args, **kwargs):
+        users, recipes = recalculate_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: пользователей {users}, рецептов {recipes}.'))
@@ -0,0 +1,192 @@
+import random
+import time
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import (LOCAL_CACHE_WARNING, TAGS_TABLE, bump_table_version,
+                       invalidate_all_recipes, is_cache_shared)
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.short_links import encode_short_code
+from users.models import Follow, User
+from .load_ingredients import batches
+from .recalculate_counters import recalculate_counters
+
+USERNAME_PREFIX = 'seed_'
+SEED_PASSWORD = 'seed-password'
+SEED_TAGS = (
+    ('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'), ('Выпечка', 'bakery'), ('Суп', 'soup'),
+    ('Салат', 'salad'), ('Напиток', 'drink'),
+)
+SKEW = 1.1
+MAX_DRAW_ROUNDS = 10
+
+
+def power_law(rng, items):
+    """Перемешанные элементы и накопленные веса 1 / rank ** SKEW."""
+    items = list(items)
+    rng.shuffle(items)
+    return items, list(accumulate(
+        1 / (rank + 1) ** SKEW for rank in range(len(items))))
+
+
+def pick_distinct(rng, items, cum_weights, k):
+    """До k разных элементов с учетом весов, порядок детерминирован."""
+    k = min(k, len(items))
+    picked = {}
+    for _ in range(MAX_DRAW_ROUNDS):
+        if len(picked) >= k:
+            break
+        for item in rng.choices(items, cum_weights=cum_weights, k=k):
+            picked.setdefault(item, None)
+    return list(picked)[:k]
+
+
+class Command(BaseCommand):
+    help = ('Синтетические данные продового объема: юзеры, рецепты, '
+            'подписки, избранное и корзины со степенным распределением. '
+            'Один seed дает одинаковые данные. Сервер увидит их только '
+            'при общем кеше (CACHE_BACKEND), иначе его нужно перезапустить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Среднее число ингредиентов в рецепте.')
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала удалить данные прошлого запуска.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        seed_users = User.objects.filter(
+            username__startswith=USERNAME_PREFIX)
+        with transaction.atomic():
+            if options['clear']:
+                self.stage('Удаление прошлого запуска', seed_users.delete)
+            elif seed_users.exists():
+                raise CommandError(
+                    'Данные уже сгенерированы, запустите с --clear.')
+            self.stage('Ингредиенты', call_command, 'load_ingredients',
+                       stdout=self.stdout, stderr=StringIO())
+            tag_ids = self.stage('Тэги', self.create_tags)
+            user_ids = self.stage(
+                'Пользователи', self.create_users, options['users'])
+            recipe_ids = self.stage(
+                'Рецепты', self.create_recipes, user_ids, tag_ids,
+                options['recipes'], options['ingredients_per_recipe'])
+            self.stage('Подписки', self.create_follows, user_ids,
+                       options['follows_per_user'])
+            for model, per_user in (
+                    (FavoriteRecipe, options['favorites_per_user']),
+                    (ShoppingCart, options['carts_per_user'])):
+                self.stage(model._meta.verbose_name_plural,
+                           self.create_user_recipes, model, user_ids,
+                           recipe_ids, per_user)
+            self.stage('Счетчики', recalculate_counters)
+            transaction.on_commit(invalidate_all_recipes)
+            transaction.on_commit(lambda: bump_table_version(TAGS_TABLE))
+        if not is_cache_shared():
+            self.stderr.write(self.style.WARNING(LOCAL_CACHE_WARNING))
+
+    def stage(self, title, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(
+            f'{title}: {time.perf_counter() - started:.2f} с.')
+        return result
+
+    def counts(self, average, total):
+        """Размеры от 1 до 2 * average - 1, в среднем average."""
+        return (self.rng.randint(1, max(1, 2 * average - 1))
+                for _ in range(total))
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            (Tag(name=name, slug=slug) for name, slug in SEED_TAGS),
+            ignore_conflicts=True)
+        return list(Tag.objects.filter(
+            slug__in=[slug for _, slug in SEED_TAGS]).order_by(
+            'slug').values_list('id', flat=True))
+
+    def create_users(self, total):
+        password = make_password(SEED_PASSWORD)
+        user_ids = []
+        for batch in batches(range(total), self.batch_size):
+            user_ids.extend(user.id for user in User.objects.bulk_create(
+                User(email=f'{USERNAME_PREFIX}{i}@foodgram.local',
+                     username=f'{USERNAME_PREFIX}{i}',
+                     first_name='Seed', last_name=f'User {i}',
+                     password=password)
+                for i in batch))
+        return user_ids
+
+    def create_recipes(self, user_ids, tag_ids, total, ingredients_average):
+        authors, author_weights = power_law(self.rng, user_ids)
+        ingredients, ingredient_weights = power_law(
+            self.rng, Ingredient.objects.order_by(
+                'name', 'measurement_unit').values_list('id', flat=True))
+        recipe_ids = []
+        for batch in batches(range(total), self.batch_size):
+            author_ids = self.rng.choices(
+                authors, cum_weights=author_weights, k=len(batch))
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author_id=author_id, name=f'Рецепт {i}',
+                       text='Сгенерированный рецепт.',
+                       cooking_time=self.rng.randint(5, 180),
+                       image='recipes/seed.png')
+                for i, author_id in zip(batch, author_ids))
+            for recipe in recipes:
+                recipe.url_link = encode_short_code(recipe.id)
+            Recipe.objects.bulk_update(recipes, ('url_link',))
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=self.rng.randint(1, 500))
+                for recipe, size in zip(
+                    recipes, self.counts(ingredients_average, len(recipes)))
+                for ingredient_id in pick_distinct(
+                    self.rng, ingredients, ingredient_weights, size))
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, min(3, len(tag_ids)))))
+            recipe_ids.extend(recipe.id for recipe in recipes)
+        return recipe_ids
+
+    def create_follows(self, user_ids, per_user):
+        authors, weights = power_law(self.rng, user_ids)
+        for batch in batches(
+                zip(user_ids, self.counts(per_user, len(user_ids))),
+                self.batch_size):
+            Follow.objects.bulk_create(
+                Follow(user_id=user_id, following_id=author_id)
+                for user_id, size in batch
+                for author_id in pick_distinct(
+                    self.rng, authors, weights, size)
+                if author_id != user_id)
+
+    def create_user_recipes(self, model, user_ids, recipe_ids, per_user):
+        """Избранное или корзины: популярные рецепты встречаются чаще."""
+        recipes, weights = power_law(self.rng, recipe_ids)
+        for batch in batches(
+                zip(user_ids, self.counts(per_user, len(user_ids))),
+                self.batch_size):
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, size in batch
+                for recipe_id in pick_distinct(
+                    self.rng, recipes, weights, size))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = 'ingredient_name_prefix'
+
+
+def create_prefix_index(apps, schema_editor):
+    # Поиск istartswith в PostgreSQL идет как UPPER(name::text) LIKE.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        '(UPPER(name::text) text_pattern_ops)')
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_favorites_count_recipe_in_carts_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
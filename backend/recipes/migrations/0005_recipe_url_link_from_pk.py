@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='url_link',
+            field=models.CharField(blank=True, max_length=128, null=True, unique=True),
+        ),
+    ]
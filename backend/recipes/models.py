@@ -1,8 +1,39 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.utils.crypto import get_random_string
 
 from users.models import User
+from .short_links import encode_short_code
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов."""
+
+    @staticmethod
+    def get_read_prefetches():
+        """Prefetch тэгов и ингредиентов для чтения рецептов."""
+        return (
+            'tags',
+            models.Prefetch(
+                'recipe_ingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует is_favorited и is_in_shopping_cart для юзера."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+        )
 
 
 class Recipe(models.Model):
@@ -44,7 +75,16 @@ class Recipe(models.Model):
         editable=False,
     )
 
-    url_link = models.CharField(max_length=128, unique=True)
+    url_link = models.CharField(
+        max_length=128, unique=True, null=True, blank=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ('-pub_date', 'id')
@@ -55,12 +95,19 @@ class Recipe(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.url_link:
-            while True:
-                self.url_link = get_random_string(length=8)
-                if not Recipe.objects.filter(url_link=self.url_link).exists():
-                    break
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS]
+        if self.url_link:
+            super().save(*args, **kwargs)
+            return
+        self.url_link = None
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            self.url_link = encode_short_code(self.pk)
+            Recipe.objects.filter(pk=self.pk).update(url_link=self.url_link)
 
 
 class Ingredient(models.Model):
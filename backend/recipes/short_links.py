@@ -0,0 +1,21 @@
+import string
+
+ALPHABET = string.digits + string.ascii_letters
+SHORT_CODE_LENGTH = 7
+MODULUS = len(ALPHABET) ** SHORT_CODE_LENGTH
+MULTIPLIER = 2654435761
+
+
+def encode_short_code(pk):
+    """Короткий код рецепта: перемешанный pk в base62.
+
+    Умножение по модулю 62**7 взаимно однозначно, поэтому коды не
+    совпадают и проверять их уникальность не нужно. Старые случайные
+    коды длиной 8 с новыми тоже не пересекаются.
+    """
+    value = pk * MULTIPLIER % MODULUS
+    chars = []
+    for _ in range(SHORT_CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
@@ -18,6 +18,7 @@ class UserAdmin(UserAdmin):
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
     )
     list_display_links = ('id', 'username')
     search_fields = (
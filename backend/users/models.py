@@ -24,9 +24,12 @@ class User(AbstractUser):
     avatar = models.ImageField(
         'Аватар', upload_to='media/avatar',
         null=True, blank=True, default=None)
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов', default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password')
+    COUNTER_FIELDS = ('recipes_count',)
 
     class Meta:
         ordering = ('username', 'id')
@@ -36,6 +39,14 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     """Модель подписок."""